@@ -1,50 +1,300 @@
-from fastapi import FastAPI
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-import pandas as pd
-from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Optional
 from fastapi_cache import FastAPICache
 from fastapi_cache.decorator import cache
 from fastapi_cache.backends.inmemory import InMemoryBackend
-from queries import MINT_BURN_QUERIES
+import instrumentation
+import payloads
+import profiling
+import asyncio
+import importlib
+import logging
 import os
+import time
 app = FastAPI()
+app.middleware("http")(instrumentation.metrics_middleware)
+app.middleware("http")(profiling.profiling_middleware)
+logger = logging.getLogger(__name__)
 
-# Initialize cache on startup
+# Constants
+CACHE_TTL = int(os.getenv('CACHE_TTL', 4*60*60))
+SNAPSHOT_REFRESH_SECONDS = int(os.getenv('SNAPSHOT_REFRESH_SECONDS', 5*60))
+# How long startup waits for the first snapshot before serving anyway
+WARMUP_TIMEOUT = int(os.getenv('WARMUP_TIMEOUT', 120))
+WARMUP_RETRY_SECONDS = 10
+# Data older than this, or whose last refresh failed, is served marked stale
+STALE_AFTER_SECONDS = int(os.getenv('STALE_AFTER_SECONDS', 2*SNAPSHOT_REFRESH_SECONDS))
+WALLET_REFRESH_SECONDS = int(os.getenv('WALLET_REFRESH_SECONDS', 60))
+# Point budgets accepted by /series/{name}?points=
+MIN_SERIES_POINTS = 50
+MAX_SERIES_POINTS = 5000
+SERIES_POINTS_STEP = 50
+# Default window for /staking
+STAKING_WINDOW_SECONDS = 14*24*60*60
+# off, poll or subscribe; see live.py
+LIVE_MODE = os.getenv('LIVE_MODE', 'off')
+
+# snapshot.py pulls in pandas and gql and compiles the query documents; it is
+# imported during warmup, off the request path
+snapshot = None
+
+# Latest precomputed dashboard metrics, replaced wholesale on each refresh
+latest_snapshot = None
+snapshot_built_at = None  # time.time() of the last successful refresh
+snapshot_refresh_failing = False
+# Set once warmup has primed the caches; created in startup, on the serving loop
+warm = None
+# Live KPI feed, when LIVE_MODE is enabled
+live_feed = None
+# Per-wallet index (wallets.py), built in the background after startup
+wallet_index = None
+
+# Initialize cache, then warm up before uvicorn starts accepting requests
 @app.on_event("startup")
 async def startup():
+    global warm
+    warm = asyncio.Event()
     FastAPICache.init(InMemoryBackend())
+    app.state.snapshot_task = asyncio.create_task(refresh_snapshot_periodically())
+    app.state.wallet_task = asyncio.create_task(refresh_wallets_periodically())
+    try:
+        await asyncio.wait_for(warm.wait(), timeout=WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Warmup did not finish within %ss; serving while it continues", WARMUP_TIMEOUT)
+
+async def warm_up():
+    """Import the heavy modules, build the first snapshot and prime the cached endpoints"""
+    global snapshot
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(importlib.import_module, 'snapshot')
+    await refresh_snapshot()
+    if latest_snapshot is not None:
+        # Same cache key as a plain GET /distribution
+        await get_distribution()
+        if LIVE_MODE != 'off':
+            await start_live()
+        warm.set()
+
+async def start_live():
+    global live_feed
+    live = await asyncio.to_thread(importlib.import_module, 'live')
+    live_feed = live.LiveFeed(LIVE_MODE)
+    live_feed.rebase(latest_snapshot)
+    app.state.live_task = asyncio.create_task(live_feed.run())
+
+def build_snapshot():
+    current = snapshot.build_snapshot()
+    # Encode the series before the snapshot goes live, not on its first request
+    payloads.prepare(current, latest_snapshot)
+    return current
 
-# Constants and client setup
-PRECISION = 1e9
-GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'http://localhost:8080/v1/graphql')
-CACHE_TTL = 4*60*60
+async def refresh_snapshot():
+    global latest_snapshot, snapshot_built_at, snapshot_refresh_failing
+    started = time.perf_counter()
+    try:
+        # Build off the event loop so requests keep being served during a refresh
+        latest_snapshot = await asyncio.to_thread(build_snapshot)
+        snapshot_built_at = time.time()
+        snapshot_refresh_failing = False
+        instrumentation.SNAPSHOT_LAST_SUCCESS.set_to_current_time()
+        if live_feed is not None:
+            live_feed.rebase(latest_snapshot)
+    except Exception:
+        snapshot_refresh_failing = True
+        instrumentation.SNAPSHOT_REFRESH_FAILURES.inc()
+        logger.exception("Snapshot refresh failed; serving the previous snapshot as stale")
+    instrumentation.SNAPSHOT_REFRESH_SECONDS.observe(time.perf_counter() - started)
+
+async def refresh_snapshot_periodically():
+    while True:
+        if warm.is_set():
+            await refresh_snapshot()
+        else:
+            await warm_up()
+        await asyncio.sleep(SNAPSHOT_REFRESH_SECONDS if warm.is_set() else WARMUP_RETRY_SECONDS)
+
+async def refresh_wallets_periodically():
+    global wallet_index
+    # The first build fetches every wallet event; let warmup go first
+    await warm.wait()
+    while True:
+        try:
+            if wallet_index is None:
+                wallets = await asyncio.to_thread(importlib.import_module, 'wallets')
+                wallet_index = await asyncio.to_thread(wallets.load_index)
+            await asyncio.to_thread(wallet_index.update)
+        except Exception:
+            logger.exception("Wallet index update failed; retrying")
+        await asyncio.sleep(WALLET_REFRESH_SECONDS)
+
+def snapshot_is_stale():
+    return snapshot_refresh_failing or time.time() - snapshot_built_at > STALE_AFTER_SECONDS
 
-transport = RequestsHTTPTransport(url=GRAPHQL_URL)
-client = Client(transport=transport, fetch_schema_from_transport=False)
+@app.middleware("http")
+async def mark_staleness(request, call_next):
+    """Tell clients how old the data behind every response is"""
+    response = await call_next(request)
+    if snapshot_built_at is not None:
+        response.headers['X-Snapshot-Age'] = str(int(time.time() - snapshot_built_at))
+        response.headers['X-Snapshot-Stale'] = 'true' if snapshot_is_stale() else 'false'
+    return response
+
+def require_snapshot():
+    if latest_snapshot is None:
+        raise HTTPException(status_code=503, detail="Snapshot not computed yet")
+    return latest_snapshot
 
 @app.get("/distribution")
-@cache(expire=CACHE_TTL)  # Cache for 4 hours
+@cache(expire=CACHE_TTL)  # Cache for 4 hours by default
 async def get_distribution():
+    """The stakers' share (1/200) of the last two weeks of mints, and those mints.
+
+    This is what mints send to stakers, including mints while nothing is staked; the USDM
+    actually paid out is `staker_rewards` in /snapshot's KPIs."""
+    # The snapshot already sums the last two weeks of mints; no upstream query needed
+    kpis = require_snapshot()["kpis"]
+    return {
+        "two_week_distribution": kpis["two_week_distribution"],
+        "total_mints": kpis["two_week_mints"],
+        "timestamp": datetime.now().isoformat(),
+        "cache_timestamp": datetime.now().isoformat(),
+        "cache_ttl": CACHE_TTL
+    }
+
+@app.get("/healthz", include_in_schema=False)
+async def get_health():
+    """Liveness: the process is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def get_ready():
+    """Readiness: warmup finished and the cached endpoints are primed"""
+    if not warm.is_set():
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", "generated_at": latest_snapshot["generated_at"]}
+
+@app.get("/snapshot")
+async def get_snapshot(request: Request):
+    """Precomputed KPI card values and the names of the available series"""
+    current = require_snapshot()
+    live_kpis = live_feed.kpis if live_feed is not None else None
+    live_updated_at = live_feed.updated_at if live_kpis else None
+    stale = snapshot_is_stale()
+    content = {
+        "generated_at": current["generated_at"],
+        "refresh_interval": SNAPSHOT_REFRESH_SECONDS,
+        # True while refreshes fail; the values are the last good ones
+        "stale": stale,
+        # In live mode the card totals include events since the snapshot
+        "kpis": live_kpis or current["kpis"],
+        "live_updated_at": live_updated_at,
+        "series": sorted(current["series"]),
+    }
+    return payloads.respond(request, payloads.json_payload(content))
+
+@app.get("/series/{name}")
+async def get_series(name: str, request: Request, points: Optional[int] = None, y: Optional[str] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     resolution: Optional[str] = None):
+    """Precomputed series backing one dashboard chart, as JSON, MessagePack or Arrow,
+    optionally over [start, end] at another resolution than daily, and downsampled to
+    about `points` rows per line, chosen by column `y`"""
+    current = require_snapshot()
+    if name not in current["series"]:
+        raise HTTPException(status_code=404, detail=f"Unknown series: {name}")
+    fmt = payloads.requested_format(request)
+    if points is not None:
+        if points < MIN_SERIES_POINTS:
+            raise HTTPException(status_code=400, detail=f"points must be at least {MIN_SERIES_POINTS}")
+        # Bounded and rounded, so the per-snapshot payload cache holds few variants
+        points = min(points, MAX_SERIES_POINTS) // SERIES_POINTS_STEP * SERIES_POINTS_STEP
+        frame = current["frames"][name]
+        if y is not None and (y not in frame.columns or frame[y].dtype.kind not in 'iuf'):
+            raise HTTPException(status_code=400, detail=f"Not a numeric column of {name}: {y}")
+    elif y is not None:
+        raise HTTPException(status_code=400, detail="y only applies with points")
+    if start is None and end is None and resolution is None:
+        return payloads.respond(request, payloads.series_payload(current, name, fmt, points, y))
+    window = (start, end, resolution or "1D")
+    try:
+        # Other resolutions query the upstream; keep that off the event loop
+        payload = await asyncio.to_thread(payloads.series_payload, current, name, fmt, points, y, window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        logger.exception("Range query for %s failed", name)
+        raise HTTPException(status_code=503, detail="Upstream unavailable; only daily ranges can be served")
+    return payloads.respond(request, payload)
+
+@app.get("/kpis")
+async def get_kpis(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """KPI card values with deltas over [start, end]; the whole history up to now by default"""
+    current = require_snapshot()
+    from ranges import range_kpis
+
+    try:
+        return range_kpis(current, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/collateral")
+async def get_collateral(resolution: str = "1D", start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Total collateral, debt, latest redemption price and implied TCR per asset, at any resolution"""
+    require_snapshot()
     try:
-        two_weeks_ago = datetime.now() - timedelta(days=14)
-        mint_result = client.execute(gql(MINT_BURN_QUERIES["mint"]))
-        mint_df = pd.DataFrame(mint_result['USDM_Mint'])
-        mint_df['timestamp'] = pd.to_datetime(mint_df['timestamp'], unit='s')
-        mint_df['amount'] = mint_df['amount'].astype(float) / PRECISION
-        
-        two_weeks_mints = mint_df[mint_df['timestamp'] >= two_weeks_ago]['amount'].sum()
-        two_week_distribution = two_weeks_mints / 200
-
-        return {
-            "two_week_distribution": two_week_distribution,
-            "total_mints": two_weeks_mints,
-            "timestamp": datetime.now().isoformat(),
-            "cache_timestamp": datetime.now().isoformat(),
-            "cache_ttl": CACHE_TTL
-        }
-    except Exception as e:
-        return {"error": str(e)}, 500
+        df = snapshot.collateral_ledger.series(resolution, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"resolution": resolution, "data": snapshot.to_records(df)}
+
+@app.get("/wallet/{identity}")
+async def get_wallet(identity: str):
+    """A wallet's troves, collateral history, SP and staking balances and estimated rewards"""
+    if wallet_index is None or wallet_index.updated_at is None:
+        raise HTTPException(status_code=503, detail="Wallet index not built yet")
+    wallet = wallet_index.lookup(identity)
+    if wallet is None:
+        raise HTTPException(status_code=404, detail=f"Unknown wallet: {identity}")
+    return wallet
+
+def staking_window(start, end, identity=None):
+    """Ledger window for the query parameters; the last two weeks by default"""
+    require_snapshot()
+    end = end.timestamp() if end else time.time()
+    start = start.timestamp() if start else end - STAKING_WINDOW_SECONDS
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    window = snapshot.staking_ledger.window(start, end, identity)
+    if window is None:
+        raise HTTPException(status_code=404, detail=f"Unknown staker: {identity}")
+    window.update(start=datetime.fromtimestamp(start).isoformat(), end=datetime.fromtimestamp(end).isoformat())
+    return window
+
+@app.get("/staking")
+async def get_staking(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Time-weighted MOOR staked, USDM paid to stakers and realized APR over a window"""
+    return staking_window(start, end)
+
+@app.get("/staking/{identity}")
+async def get_staker(identity: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """One staker's time-weighted stake, rewards and realized APR over a window"""
+    return staking_window(start, end, identity)
+
+@app.get("/live")
+async def get_live():
+    """Server-Sent Events: the live KPI state, then a delta for every change"""
+    if live_feed is None:
+        raise HTTPException(status_code=404, detail="Live mode is off")
+    return StreamingResponse(live_feed.stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus exposition of upstream, transform, cache and snapshot metrics"""
+    payload, content_type = instrumentation.render_metrics()
+    return Response(content=payload, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
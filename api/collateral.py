@@ -0,0 +1,239 @@
+"""System-wide active troves, collateral and debt per asset over time.
+
+Every event that changes a trove (open, adjust, close, full and partial
+liquidation, redemption) is applied once, in timestamp order, to the state of
+that ``(identity, asset)`` trove, and the difference goes into running
+per-asset totals kept as step functions of time. A trove counts as active from
+its open until its collateral is gone, so a liquidation after a close or a
+reopen cannot skew the count. Redemptions also record the collateral price
+they were executed at. A series at any resolution is then one binary search
+per bucket into the totals, and later updates only fetch events newer than the
+per-field cursors.
+
+Set TROVE_STATE_PATH to persist the ledger between restarts.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from gql import gql
+
+import datasets
+from datasets import PRECISION
+from queries import TROVE_STATE_QUERY
+from staking import Timeline
+
+TROVE_STATE_PATH = os.getenv('TROVE_STATE_PATH')
+
+# Events in the same block are applied opens first, closes last
+TROVE_EVENT_ORDER = ['opens', 'adjusts', 'partial_liquidations', 'redemptions', 'closes', 'liquidations']
+SERIES_COLUMNS = ['timestamp', 'asset', 'active_troves', 'collateral', 'debt', 'price', 'tcr']
+# Upper bound on buckets per asset in one series
+MAX_BUCKETS = 10_000
+
+trove_state_query = gql(TROVE_STATE_QUERY)
+
+
+def _amount(row, field):
+    return float(row[field]) / PRECISION
+
+
+def trove_change(field, row, collateral, debt):
+    """A trove's (collateral, debt) after one of its events, given its state before"""
+    if field in ('opens', 'adjusts'):
+        collateral, debt = _amount(row, 'collateral'), _amount(row, 'debt')
+    elif field == 'partial_liquidations':
+        collateral, debt = _amount(row, 'remaining_collateral'), _amount(row, 'remaining_debt')
+    elif field == 'redemptions':
+        collateral -= _amount(row, 'collateral_amount')
+        debt -= _amount(row, 'usdm_amount')
+    else:
+        collateral, debt = 0.0, 0.0
+    return max(collateral, 0.0), max(debt, 0.0)
+
+
+def bucket_step(freq):
+    """The bucket size for a resolution such as 1h, 1D or 7D"""
+    try:
+        step = pd.Timedelta(freq)
+    except ValueError:
+        step = None
+    if step is None or step <= pd.Timedelta(0):
+        raise ValueError(f"Invalid resolution: {freq}; use e.g. 1D, 6h or 15min")
+    return step
+
+
+def bucket_range(start, end, step):
+    """Start of each `step` bucket from the one holding `start` through `end`"""
+    if (end - start) / step > MAX_BUCKETS:
+        raise ValueError(f"More than {MAX_BUCKETS} buckets; use a coarser resolution or a shorter range")
+    return pd.date_range(start.floor(step), end, freq=step)
+
+
+def sample(timeline, timestamps):
+    """The timeline's value at each timestamp (numpy array of epoch seconds)"""
+    if not timeline.times:
+        return np.zeros(len(timestamps))
+    positions = np.searchsorted(timeline.times, timestamps, side='right') - 1
+    values = np.asarray(timeline.values)[np.maximum(positions, 0)]
+    return np.where(positions >= 0, values, 0.0)
+
+
+class CollateralLedger:
+    """Per-trove state and per-asset collateral, debt and price, advanced by the events past the cursors"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.cursors = state.get('cursors', {})
+        # (identity, asset) -> [collateral, debt] of the active troves
+        self.troves = {(identity, asset): [collateral, debt]
+                       for identity, asset, collateral, debt in state.get('troves', [])}
+        # Per asset: active troves, total collateral, total debt
+        self.active = self._timelines(state, 'active')
+        self.collateral = self._timelines(state, 'collateral')
+        self.debt = self._timelines(state, 'debt')
+        # Collateral price of each asset's latest redemption
+        self.prices = self._timelines(state, 'prices')
+        self.updated_at = state.get('updated_at')
+        self.lock = threading.Lock()
+        # Held from fetch to apply, so the snapshot refresh and live mode never apply an event twice
+        self.updating = threading.Lock()
+
+    @staticmethod
+    def _timelines(state, name):
+        return {asset: Timeline.from_state(timeline) for asset, timeline in state.get(name, {}).items()}
+
+    def update(self):
+        """Fetch and apply the events past the cursors; return how many were applied"""
+        with self.updating:
+            variables = {field: self.cursors.get(field, 0) for field in TROVE_EVENT_ORDER}
+            result = datasets.execute_settled(trove_state_query, 'trove_state', variables)
+            with self.lock:
+                applied = self.apply(result)
+                self.updated_at = datetime.now().isoformat()
+            if applied and TROVE_STATE_PATH:
+                self.save(TROVE_STATE_PATH)
+        return applied
+
+    def apply(self, result):
+        events = sorted(
+            ((int(row['timestamp']), TROVE_EVENT_ORDER.index(field), field, row)
+             for field, rows in result.items() for row in rows),
+            key=lambda event: event[:2],
+        )
+        for timestamp, _, field, row in events:
+            asset = row['asset']
+            if field == 'redemptions' and float(row['collateral_price']) > 0:
+                self.prices.setdefault(asset, Timeline()).set(timestamp, _amount(row, 'collateral_price'))
+            key = (row['identity'], asset)
+            state = self.troves.get(key)
+            if state is None:
+                if field != 'opens':
+                    # A trove opened before the indexed history began
+                    continue
+                state = self.troves[key] = [0.0, 0.0]
+                self.count(asset, timestamp, 1)
+            collateral, debt = trove_change(field, row, *state)
+            if collateral == 0:
+                # Closed, liquidated or fully redeemed; no debt is left without collateral
+                debt = 0.0
+            for totals, change in ((self.collateral, collateral - state[0]), (self.debt, debt - state[1])):
+                timeline = totals.setdefault(asset, Timeline())
+                timeline.set(timestamp, timeline.last() + change)
+            if collateral == 0:
+                del self.troves[key]
+                self.count(asset, timestamp, -1)
+            else:
+                state[:] = collateral, debt
+        for field, rows in result.items():
+            if rows:
+                self.cursors[field] = int(rows[-1]['timestamp'])
+        return len(events)
+
+    def active_troves(self):
+        """Active troves across assets after the last applied event"""
+        with self.lock:
+            return float(sum(timeline.last() for timeline in self.active.values()))
+
+    def count(self, asset, timestamp, change):
+        timeline = self.active.setdefault(asset, Timeline())
+        timeline.set(timestamp, timeline.last() + change)
+
+    def daily_active(self):
+        """Active troves per asset at the end of each day the count changed, plus the last day"""
+        with self.lock:
+            frames = []
+            last_day = max((timeline.times[-1] for timeline in self.active.values() if timeline.times), default=None)
+            for asset in sorted(self.active):
+                timeline = self.active[asset]
+                days = np.asarray(timeline.times, dtype=np.int64) // 86400
+                # The last change of each day holds that day's closing count
+                closing = np.append(days[1:] != days[:-1], True)
+                frames.append(pd.DataFrame({
+                    'timestamp': pd.to_datetime(days[closing], unit='D'), 'asset': asset,
+                    'active_troves': np.asarray(timeline.values)[closing],
+                }))
+                if len(days) and days[-1] < last_day // 86400:
+                    # Carry the count to the end so every asset's line spans the whole range
+                    frames.append(pd.DataFrame({
+                        'timestamp': [pd.to_datetime(last_day // 86400, unit='D')], 'asset': asset,
+                        'active_troves': [timeline.values[-1]],
+                    }))
+        if not frames:
+            return pd.DataFrame(columns=['timestamp', 'asset', 'active_troves'])
+        return pd.concat(frames, ignore_index=True)
+
+    def save(self, path):
+        """Write the ledger atomically so a restart resumes from the cursors"""
+        with self.lock:
+            payload = json.dumps({
+                'cursors': self.cursors,
+                'troves': [[identity, asset, *state] for (identity, asset), state in self.troves.items()],
+                **{name: {asset: timeline.state() for asset, timeline in getattr(self, name).items()}
+                   for name in ('active', 'collateral', 'debt', 'prices')},
+                'updated_at': self.updated_at,
+            })
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def series(self, freq='1D', start=None, end=None):
+        """Active troves, collateral, debt, latest redemption price and implied TCR (%) per asset at
+        the end of each `freq` bucket between `start` and `end` (default: the first and last event)"""
+        step = bucket_step(freq)
+        with self.lock:
+            times = [timeline.times for timeline in self.collateral.values() if timeline.times]
+            if not times:
+                return pd.DataFrame(columns=SERIES_COLUMNS)
+            start = pd.Timestamp(start) if start is not None else pd.to_datetime(min(t[0] for t in times), unit='s')
+            end = pd.Timestamp(end) if end is not None else pd.to_datetime(max(t[-1] for t in times), unit='s')
+            buckets = bucket_range(start, end, step)
+            # Each bucket's value is the state after its last event
+            bucket_ends = ((buckets + step - pd.Timestamp(0)) // pd.Timedelta(seconds=1) - 1).to_numpy(dtype=float)
+            frames = []
+            for asset in sorted(self.collateral):
+                collateral = sample(self.collateral[asset], bucket_ends)
+                debt = sample(self.debt[asset], bucket_ends)
+                price = sample(self.prices.get(asset, Timeline()), bucket_ends)
+                frames.append(pd.DataFrame({
+                    'timestamp': buckets, 'asset': asset,
+                    'active_troves': sample(self.active.get(asset, Timeline()), bucket_ends),
+                    'collateral': collateral, 'debt': debt,
+                    # Unknown until the asset's first redemption
+                    'price': np.where(price > 0, price, np.nan),
+                }))
+        df = pd.concat(frames, ignore_index=True)
+        df['tcr'] = (df['collateral'] * df['price'] / df['debt'].where(df['debt'] > 0)) * 100
+        return df
+
+
+def load_ledger():
+    """The persisted ledger from TROVE_STATE_PATH if there is one, else an empty ledger"""
+    if TROVE_STATE_PATH and os.path.exists(TROVE_STATE_PATH):
+        with open(TROVE_STATE_PATH) as f:
+            return CollateralLedger(json.load(f))
+    return CollateralLedger()
@@ -0,0 +1,213 @@
+"""Process-wide access to the upstream's event datasets.
+
+Every GraphQL query of the process goes through one pool of clients, so
+concurrent callers (snapshot refresh, ledgers, wallet index, range requests,
+reward scripts) share a bounded number of connections. The event datasets are
+decoded once into typed DataFrames (BigInt amounts scaled by PRECISION, Unix
+timestamps as datetimes) and kept in a keyed cache with LRU and TTL eviction
+and byte accounting, so a dataset asked for by several code paths is fetched
+and decoded once per DATASET_CACHE_TTL, whichever asks first. With
+EVENT_STORE_DIR set, they are read from the memory-mapped generation written
+by the sync process instead (see eventstore.py).
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+from gql import gql
+
+import eventstore
+import instrumentation
+import upstream
+from instrumentation import transform_timer
+from queries import (
+    LIQUIDATION_QUERY,
+    MINT_BURN_QUERIES,
+    REDEMPTION_QUERY,
+    STABILITY_POOL_QUERY,
+    TOTAL_SUPPLY_QUERY,
+)
+
+GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'http://localhost:8080/v1/graphql')
+# Upstream amounts are BigInts with 9 decimals
+PRECISION = 1e9
+# Clients per process; callers beyond this wait for a free one
+CLIENT_POOL_SIZE = int(os.getenv('CLIENT_POOL_SIZE', 4))
+# Shorter than the snapshot refresh interval, so each refresh sees new events
+DATASET_CACHE_TTL = int(os.getenv('DATASET_CACHE_TTL', 60))
+DATASET_CACHE_BYTES = int(os.getenv('DATASET_CACHE_BYTES', 256 * 1024 * 1024))
+# The [start, end) bounds of the dataset queries that cover every indexed event
+ALL_TIME = (0, 2**31 - 1)
+# Incremental queries resume after the second of the last event applied, so only events at
+# least this old when queried are applied: by then every event of their second is indexed
+CURSOR_SAFETY_SECONDS = int(os.getenv('CURSOR_SAFETY_SECONDS', 30))
+
+# Columns holding upstream BigInt amounts
+BIGINT_COLUMNS = {
+    'amount', 'collateral', 'debt', 'usdm_amount', 'collateral_amount', 'collateral_price',
+    'remaining_collateral', 'remaining_debt', 'compounded_amount', 'debt_to_offset', 'collateralChange',
+}
+
+# Event datasets by name, each a query over a [$start, $end) timestamp range
+DATASETS = {
+    'supply': gql(TOTAL_SUPPLY_QUERY),
+    'mint': gql(MINT_BURN_QUERIES['mint']),
+    'burn': gql(MINT_BURN_QUERIES['burn']),
+    'stability_pool': gql(STABILITY_POOL_QUERY),
+    'redemptions': gql(REDEMPTION_QUERY),
+    'liquidations': gql(LIQUIDATION_QUERY),
+}
+
+
+class ClientPool:
+    """Sync gql clients shared by every thread of the process, each used by one thread at a time"""
+
+    def __init__(self, factory, size=CLIENT_POOL_SIZE):
+        self.factory = factory
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def client(self):
+        with self.slots:
+            try:
+                client = self.idle.get_nowait()
+            except queue.Empty:
+                client = self.factory()
+            try:
+                yield client
+            finally:
+                self.idle.put(client)
+
+
+class ResultCache:
+    """Keyed values with LRU and TTL eviction, bounded by their approximate size in bytes"""
+
+    def __init__(self, max_bytes=DATASET_CACHE_BYTES, ttl=DATASET_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires, size, value)
+        self.bytes = 0
+        self.loading = {}  # key -> Event set once its load finishes
+        self.lock = threading.Lock()
+
+    def get(self, key, load, size):
+        """The cached value for `key`, else load() it; concurrent callers for one key share one load"""
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    instrumentation.DATASET_CACHE_REQUESTS.labels(key[0], 'hit').inc()
+                    return entry[2]
+                loading = self.loading.get(key)
+                if loading is None:
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # Another thread is loading it; use its result, or load it if that failed
+            loading.wait()
+        instrumentation.DATASET_CACHE_REQUESTS.labels(key[0], 'miss').inc()
+        try:
+            value = load()
+            self.put(key, value, size(value))
+            return value
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading.set()
+
+    def put(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            if size <= self.max_bytes:
+                self.entries[key] = (time.monotonic() + self.ttl, size, value)
+                self.bytes += size
+            now = time.monotonic()
+            for old_key in [k for k, (expires, _, _) in self.entries.items() if expires <= now]:
+                self.bytes -= self.entries.pop(old_key)[1]
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+            instrumentation.DATASET_CACHE_BYTES.set(self.bytes)
+
+
+pool = ClientPool(lambda: upstream.make_client(GRAPHQL_URL))
+cache = ResultCache()
+
+
+def configure(url=None, factory=None):
+    """Point the process's client pool at another upstream URL, or at clients made by `factory`"""
+    global pool
+    pool = ClientPool(factory or (lambda: upstream.make_client(url or GRAPHQL_URL)))
+
+
+def execute(document, query_name, variables=None):
+    """Run a query on a pooled client, through the upstream breaker and retries; rows as returned"""
+    with pool.client() as client:
+        return upstream.execute(client, document, query_name, variables)
+
+
+def execute_settled(document, query_name, variables):
+    """execute() a query for the events past the cursors, without the rows newer than
+    CURSOR_SAFETY_SECONDS before it was sent; the next query fetches those again"""
+    cutoff = time.time() - CURSOR_SAFETY_SECONDS
+    result = execute(document, query_name, variables)
+    return {field: [row for row in rows if int(row['timestamp']) <= cutoff] for field, rows in result.items()}
+
+
+def settled(frames):
+    """Frames of a dataset without the rows newer than CURSOR_SAFETY_SECONDS before it was
+    fetched, so cursors taken from them can be tailed with the incremental queries"""
+    sliced = {}
+    for field, df in frames.items():
+        cutoff = pd.Timestamp(int(df.attrs['fetched_at'] - CURSOR_SAFETY_SECONDS), unit='s')
+        # Every dataset is in timestamp order
+        sliced[field] = df.iloc[:df['timestamp'].searchsorted(cutoff, side='right')]
+    return sliced
+
+
+def columns(document):
+    """Selected columns per root field (alias if any) of a query document"""
+    operation = document.document.definitions[0]
+    return {(field.alias or field.name).value: [column.name.value for column in field.selection_set.selections]
+            for field in operation.selection_set.selections}
+
+
+def decode(rows, names):
+    """Rows as a DataFrame with the given columns: BigInt amounts as floats, timestamps as datetimes"""
+    df = pd.DataFrame(rows, columns=names)
+    for name in df.columns:
+        if name == 'timestamp':
+            df[name] = pd.to_datetime(df[name].astype('int64'), unit='s')
+        elif name in BIGINT_COLUMNS:
+            df[name] = df[name].astype(float) / PRECISION
+    return df
+
+
+def fetch_dataset(name, start=ALL_TIME[0], end=ALL_TIME[1], cached=True):
+    """Decoded events of dataset `name` with timestamps in [start, end) (Unix seconds), one
+    DataFrame per root field; never mutate them, they are shared with other callers.
+    `cached=False` always queries the upstream."""
+    document = DATASETS[name]
+
+    def load():
+        fetched_at = time.time()
+        result = execute(document, name, {'start': int(start), 'end': int(end)})
+        with transform_timer(name, 'decode'):
+            frames = {field: decode(result[field], names) for field, names in columns(document).items()}
+        for df in frames.values():
+            df.attrs['fetched_at'] = fetched_at
+        return frames
+
+    if not cached:
+        return load()
+    frames = eventstore.read(name, start, end)
+    if frames is not None:
+        instrumentation.DATASET_CACHE_REQUESTS.labels(name, 'mapped').inc()
+        return frames
+    return cache.get((name, int(start), int(end)), load,
+                     lambda frames: sum(int(df.memory_usage(deep=True).sum()) for df in frames.values()))
@@ -0,0 +1,71 @@
+"""Shape-preserving downsampling of line series, and outlier removal.
+
+A chart cannot show more points than it has pixels across, so line series are
+reduced to a point budget with Largest-Triangle-Three-Buckets: the first and
+last points are kept and each bucket in between keeps the point forming the
+largest triangle with its neighbours, which preserves peaks, troughs and
+steps far better than taking every n-th row. Each line (e.g. each asset) gets
+the full budget.
+"""
+import numpy as np
+import pandas as pd
+
+# Value column a series is plotted by, and the columns that split it into lines
+SERIES_LINES = {
+    'supply': ('amount', []),
+    'mint_burn': ('amount', ['type']),
+    'troves': ('active_troves', ['asset']),
+    'collateral': ('collateral', ['asset']),
+    'moor_staking': ('total_staked', []),
+    'stability_pool': ('total_deposited', []),
+    'redemptions': ('redemption_rate', ['asset']),
+    'liquidations': ('debt', ['asset', 'type']),
+}
+
+
+def outliers(values, threshold, window=5):
+    """Mask of points further than `threshold` from the rolling median around them.
+
+    Isolated glitches of up to window // 2 points are caught; a genuine level
+    shift is not, since the median follows it."""
+    median = values.rolling(window, center=True, min_periods=1).median()
+    return (values - median).abs() > threshold
+
+
+def lttb(x, y, points):
+    """Positions of the `points` samples of (x, y) kept by Largest-Triangle-Three-Buckets"""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    # Points 1..n-2 split into points - 2 buckets of at least one point each
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # The next bucket is represented by its average point
+        next_x = x[end:edges[i + 2]].mean()
+        next_y = y[end:edges[i + 2]].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample(df, y, points, by=()):
+    """At most `points` rows per line of `df`, chosen by LTTB on (timestamp, y); rows without y are dropped"""
+    df = df[df[y].notna()].sort_values('timestamp', kind='stable')
+    groups = df.groupby(list(by), sort=False).indices.values() if by else [np.arange(len(df))]
+    seconds = (pd.to_datetime(df['timestamp']) - pd.Timestamp(0)).dt.total_seconds().to_numpy()
+    values = df[y].to_numpy(dtype=float)
+    keep = [positions[lttb(seconds[positions], values[positions], points)] for positions in groups]
+    return df.iloc[np.sort(np.concatenate(keep))] if keep else df
+
+
+def downsample_series(name, df, points, y=None):
+    """Downsample a snapshot series by its default value column, or by `y`"""
+    default_y, by = SERIES_LINES.get(name, (None, []))
+    return downsample(df, y or default_y, points, [column for column in by if column in df.columns])
@@ -0,0 +1,195 @@
+"""Memory-mapped snapshots of the decoded event datasets, shared between processes.
+
+One sync process (`python eventstore.py --interval 60`) fetches every dataset in
+datasets.DATASETS and writes each decoded column as a .npy file to a new
+generation directory under EVENT_STORE_DIR (timestamps as datetime64, amounts
+as float64, assets as integer codes into a label list, read back as
+categoricals), then atomically repoints the `current` symlink at it. Every
+other process with EVENT_STORE_DIR set opens the current generation read-only
+with np.load(mmap_mode='r'), so all of them share one copy of the pages through
+the OS page cache. Memory stays flat as workers are added, and a starting
+worker reads the datasets without fetching or decoding anything.
+
+Readers fall back to the upstream when there is no generation yet or the current
+one is older than EVENT_STORE_MAX_AGE seconds, e.g. when the sync process is down.
+
+Usage:
+    EVENT_STORE_DIR=events python eventstore.py [--interval SECONDS]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EVENT_STORE_DIR = os.getenv('EVENT_STORE_DIR')
+# Older generations are ignored, so readers never serve data the sync process stopped updating
+EVENT_STORE_MAX_AGE = int(os.getenv('EVENT_STORE_MAX_AGE', 15*60))
+# Generations kept besides the current one; readers still mapping an older one keep
+# their pages after it is deleted
+KEEP_GENERATIONS = 1
+
+
+class Generation:
+    """One written generation, its columns mapped read-only on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def dataset(self, name):
+        """{field: DataFrame} of dataset `name`, or None if this generation lacks it"""
+        with self.lock:
+            if name not in self.frames:
+                fields = self.manifest['datasets'].get(name)
+                self.frames[name] = None if fields is None else {
+                    field: self.read_frame(columns) for field, columns in fields.items()}
+                for df in (self.frames[name] or {}).values():
+                    df.attrs['fetched_at'] = self.manifest['fetched_at'][name]
+            return self.frames[name]
+
+    def read_frame(self, columns):
+        data = {}
+        for column, spec in columns.items():
+            values = np.load(os.path.join(self.path, spec['file']), mmap_mode='r')
+            if 'labels' in spec:
+                values = pd.Categorical.from_codes(values, spec['labels'])
+            data[column] = pd.Series(values, name=column, copy=False)
+        return pd.DataFrame(data, copy=False)
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def current(directory=EVENT_STORE_DIR):
+    """The current generation if it is fresh enough to serve, else None"""
+    global _current
+    if not directory:
+        return None
+    try:
+        path = os.path.realpath(os.path.join(directory, 'current'))
+        with _lock:
+            if _current is None or _current.path != path:
+                _current = Generation(path)
+                logger.info("Mapped event store generation %s", path)
+            generation = _current
+    except FileNotFoundError:
+        return None
+    if time.time() - generation.manifest['generated_at'] > EVENT_STORE_MAX_AGE:
+        return None
+    if 'fetched_at' not in generation.manifest:
+        # Written before fetch times were recorded; the next sync replaces it
+        return None
+    return generation
+
+
+def read(name, start, end):
+    """Frames of dataset `name` with timestamps in [start, end) (Unix seconds) from the
+    current generation, as read-only views of its mapped columns; None if unavailable"""
+    generation = current()
+    frames = generation.dataset(name) if generation is not None else None
+    if frames is None:
+        return None
+    bounds = np.array([start, end], dtype='int64').astype('datetime64[s]')
+    sliced = {}
+    for field, df in frames.items():
+        # Every dataset is written in timestamp order
+        first, last = np.searchsorted(df['timestamp'].to_numpy(), bounds)
+        sliced[field] = df.iloc[first:last]
+    return sliced
+
+
+def write_generation(datasets_frames, directory=EVENT_STORE_DIR):
+    """Write {dataset: {field: DataFrame}} as a new generation and make it current; return its path"""
+    generations = os.path.join(directory, 'generations')
+    path = os.path.join(generations, datetime.now().strftime('%Y%m%dT%H%M%S%f'))
+    os.makedirs(path)
+    manifest = {'generated_at': time.time(), 'datasets': {}, 'fetched_at': {}}
+    for name, frames in datasets_frames.items():
+        fields = manifest['datasets'][name] = {}
+        # When the upstream was queried, which bounds the rows readers may take cursors from
+        manifest['fetched_at'][name] = min(df.attrs['fetched_at'] for df in frames.values())
+        for field, df in frames.items():
+            columns = fields[field] = {}
+            for column in df.columns:
+                spec = columns[column] = {'file': f"{name}.{field}.{column}.npy"}
+                values = df[column]
+                if column == 'timestamp':
+                    values = values.to_numpy()
+                elif pd.api.types.is_numeric_dtype(values):
+                    values = values.to_numpy(dtype='float64')
+                else:
+                    # Sorted labels, in the codes' own width, so the mapped categoricals group
+                    # like the strings did and pandas never copies the codes
+                    values = pd.Categorical(values)
+                    values, spec['labels'] = values.codes, [str(label) for label in values.categories]
+                np.save(os.path.join(path, spec['file']), values)
+    # The manifest last: a generation without one was never completed
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    # A rename over the old symlink is atomic; readers map the old generation or the new one
+    link = os.path.join(directory, 'current.tmp')
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.relpath(path, directory), link)
+    os.replace(link, os.path.join(directory, 'current'))
+
+    for old in sorted(os.listdir(generations))[:-(KEEP_GENERATIONS + 1)]:
+        shutil.rmtree(os.path.join(generations, old))
+    return path
+
+
+def sync(directory=EVENT_STORE_DIR):
+    """Fetch every dataset from the upstream and write it as a new generation"""
+    # Imported here: datasets reads through this module
+    import datasets
+
+    started = time.perf_counter()
+    frames = {name: datasets.fetch_dataset(name, cached=False) for name in datasets.DATASETS}
+    path = write_generation(frames, directory)
+    logger.info(json.dumps({
+        'event': 'event_store_sync',
+        'path': path,
+        'rows': sum(len(df) for fields in frames.values() for df in fields.values()),
+        'total_ms': round((time.perf_counter() - started) * 1000, 2),
+    }))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the decoded event datasets as memory-mapped files')
+    parser.add_argument('--interval', type=int,
+                        help='Re-sync every this many seconds instead of once')
+    args = parser.parse_args()
+    if not EVENT_STORE_DIR:
+        parser.error('EVENT_STORE_DIR is not set')
+    logging.basicConfig(level=logging.INFO)
+
+    while True:
+        try:
+            sync()
+        except Exception:
+            if not args.interval:
+                raise
+            # Readers keep the previous generation until it is too old
+            logger.exception("Event store sync failed")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
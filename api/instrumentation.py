@@ -0,0 +1,106 @@
+"""Prometheus metrics for the api's hot paths.
+
+Upstream GraphQL calls, pandas transforms, the response cache and snapshot
+refreshes are measured here and exported on the api's /metrics endpoint.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+UPSTREAM_SECONDS = Histogram(
+    'moor_upstream_query_seconds', "GraphQL query latency, including response decoding",
+    ['query'], buckets=LATENCY_BUCKETS)
+UPSTREAM_ERRORS = Counter(
+    'moor_upstream_query_errors_total', "GraphQL queries that raised", ['query'])
+UPSTREAM_RETRIES = Counter(
+    'moor_upstream_query_retries_total', "GraphQL queries retried after a transient failure", ['query'])
+BREAKER_STATE = Gauge(
+    'moor_upstream_breaker_state', "Upstream circuit breaker: 0 closed, 1 half-open, 2 open")
+UPSTREAM_ROWS = Counter(
+    'moor_upstream_rows_total', "Rows returned per GraphQL root field", ['query', 'field'])
+UPSTREAM_BYTES = Counter(
+    'moor_upstream_bytes_total', "Approximate JSON bytes returned per GraphQL root field", ['query', 'field'])
+TRANSFORM_SECONDS = Histogram(
+    'moor_transform_seconds', "pandas transform time per dataset and step",
+    ['dataset', 'step'], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'moor_cache_requests_total', "Responses by cache outcome (hit, miss)", ['path', 'result'])
+HTTP_SECONDS = Histogram(
+    'moor_http_request_seconds', "API request latency", ['path', 'status'], buckets=LATENCY_BUCKETS)
+SNAPSHOT_REFRESH_SECONDS = Histogram(
+    'moor_snapshot_refresh_seconds', "Time to rebuild the dashboard snapshot", buckets=LATENCY_BUCKETS)
+SNAPSHOT_REFRESH_FAILURES = Counter(
+    'moor_snapshot_refresh_failures_total', "Snapshot refreshes that raised")
+SNAPSHOT_LAST_SUCCESS = Gauge(
+    'moor_snapshot_last_success_timestamp_seconds', "Unix time of the last successful snapshot refresh")
+DATASET_CACHE_REQUESTS = Counter(
+    'moor_dataset_cache_requests_total', "Decoded dataset lookups by outcome (hit, miss, mapped = read from the event store)", ['dataset', 'result'])
+DATASET_CACHE_BYTES = Gauge(
+    'moor_dataset_cache_bytes', "Approximate memory held by the decoded dataset cache")
+LIVE_EVENTS = Counter(
+    'moor_live_events_total', "Events applied to the live KPIs per root field", ['field'])
+LIVE_CLIENTS = Gauge(
+    'moor_live_clients', "Connected /live event-stream clients")
+
+
+def _execute(client, document, variables):
+    if variables is None:
+        return client.execute(document)
+    try:
+        from gql import GraphQLRequest
+    except ImportError:  # gql 3 takes the variables as an execute() argument
+        return client.execute(document, variable_values=variables)
+    return client.execute(GraphQLRequest(document, variable_values=variables))
+
+
+def execute(client, document, query_name, variables=None):
+    """Execute a GraphQL document, recording latency and per-root-field rows and bytes"""
+    started = time.perf_counter()
+    try:
+        result = _execute(client, document, variables)
+    except Exception:
+        UPSTREAM_ERRORS.labels(query_name).inc()
+        raise
+    finally:
+        UPSTREAM_SECONDS.labels(query_name).observe(time.perf_counter() - started)
+    for field, rows in result.items():
+        UPSTREAM_ROWS.labels(query_name, field).inc(len(rows))
+        UPSTREAM_BYTES.labels(query_name, field).inc(len(json.dumps(rows, separators=(',', ':'))))
+    return result
+
+
+@contextmanager
+def transform_timer(dataset, step):
+    """Time one pandas step, e.g. ``decode`` (DataFrame construction) or ``aggregate`` (groupby/cumsum)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        TRANSFORM_SECONDS.labels(dataset, step).observe(time.perf_counter() - started)
+
+
+def route_label(request):
+    # Label by route template so /series/{name} does not create one series per name
+    route = request.scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+async def metrics_middleware(request, call_next):
+    """Record request latency and the fastapi-cache hit/miss outcome"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    path = route_label(request)
+    HTTP_SECONDS.labels(path, str(response.status_code)).observe(time.perf_counter() - started)
+    cache_status = response.headers.get('X-FastAPI-Cache')
+    if cache_status:
+        CACHE_REQUESTS.labels(path, cache_status.lower()).inc()
+    return response
+
+
+def render_metrics():
+    """Return the Prometheus exposition payload and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
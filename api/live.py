@@ -0,0 +1,259 @@
+"""Live KPI updates between snapshot refreshes.
+
+The running totals behind the KPI cards (USDM supply, active troves, Stability
+Pool deposits, staked MOOR) are kept current by tailing only the events newer
+than the last one applied, and every change is pushed to /live clients as a
+Server-Sent Event. Active troves are read from the shared trove ledger
+(collateral.py), which each tail advances, so a trove is counted by its own
+state rather than by counting opens and closes. LIVE_MODE selects how new
+events are noticed:
+
+- ``poll`` queries every LIVE_POLL_SECONDS for events past the cursors
+- ``subscribe`` opens Hasura streaming subscriptions on LIVE_WS_URL and runs the
+  same cursor query as soon as one of them delivers a row (requires the
+  ``websockets`` package; falls back to polling without it)
+
+Events are applied once they are datasets.CURSOR_SAFETY_SECONDS old, so the
+cursors never move past a second with events still to be indexed. Each
+snapshot refresh rebases the totals on the fresh snapshot, so any drift is
+corrected every SNAPSHOT_REFRESH_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+from gql import gql, Client
+
+import datasets
+import instrumentation
+import snapshot
+from queries import LIVE_TAIL_QUERY, LIVE_STREAM_SUBSCRIPTION
+from datasets import GRAPHQL_URL, PRECISION
+from downsample import outliers
+from snapshot import SUPPLY_JUMP_THRESHOLD
+
+LIVE_POLL_SECONDS = float(os.getenv('LIVE_POLL_SECONDS', 5))
+LIVE_WS_URL = os.getenv('LIVE_WS_URL', GRAPHQL_URL.replace('http', 'ws', 1))
+# In subscribe mode, poll this often anyway in case a subscription stalls
+LIVE_SAFETY_POLL_SECONDS = 60
+LIVE_RECONNECT_SECONDS = 10
+LIVE_KEEPALIVE_SECONDS = 15
+# Messages buffered per client before a slow client is disconnected
+LIVE_CLIENT_QUEUE = 100
+# Recent supply values the glitch filter compares against, as many as the series' rolling window
+SUPPLY_WINDOW = 5
+
+logger = logging.getLogger(__name__)
+
+# Root field of LIVE_TAIL_QUERY -> entity, KPI it moves, and sign.
+# A sign of None means the event carries the new value rather than a change.
+TAILED_FIELDS = {
+    'USDM_TotalSupplyEvent': ('USDM_TotalSupplyEvent', 'supply', None),
+    'deposits': ('StabilityPool_ProvideToStabilityPoolEvent', 'sp_deposits', 1),
+    'withdrawals': ('StabilityPool_WithdrawFromStabilityPoolEvent', 'sp_deposits', -1),
+    'stakes': ('MoorStaking_StakeEvent', 'moor_staked', 1),
+    'unstakes': ('MoorStaking_UnstakeEvent', 'moor_staked', -1),
+}
+
+# Trove ledger field -> entity; a row on one of these subscriptions wakes the tail,
+# which advances the ledger
+TROVE_SUBSCRIPTIONS = {
+    'opens': 'BorrowOperations_OpenTroveEvent',
+    'adjusts': 'BorrowOperations_AdjustTroveEvent',
+    'partial_liquidations': 'TroveManager_TrovePartialLiquidationEvent',
+    'redemptions': 'TroveManager_RedemptionEvent',
+    'closes': 'BorrowOperations_CloseTroveEvent',
+    'liquidations': 'TroveManager_TroveFullLiquidationEvent',
+}
+
+tail_query = gql(LIVE_TAIL_QUERY)
+
+
+def fetch_tail(cursors):
+    """Fetch every tailed event newer than its field's cursor and old enough to apply"""
+    variables = {field: cursors.get(field, 0) for field in TAILED_FIELDS}
+    return datasets.execute_settled(tail_query, 'live_tail', variables)
+
+
+def active_troves():
+    """Advance the shared trove ledger; active troves across assets"""
+    snapshot.collateral_ledger.update()
+    return snapshot.collateral_ledger.active_troves()
+
+
+def apply_events(kpis, cursors, result, troves=None, recent_supply=None):
+    """Apply tailed events and the ledger's active troves to the KPIs, cursors and recent
+    supply values in place; return the KPI changes"""
+    before = dict(kpis)
+    recent_supply = recent_supply if recent_supply is not None else []
+    if troves is not None:
+        kpis['troves'] = troves
+    for field, rows in result.items():
+        if not rows:
+            continue
+        _, kpi, sign = TAILED_FIELDS[field]
+        for row in rows:
+            if sign is None:
+                amount = float(row['amount']) / PRECISION
+                # Same rolling-median filter as the supply series, over the values up to this one;
+                # a real level shift moves the median and is accepted from its second value
+                recent_supply.append(amount)
+                del recent_supply[:-SUPPLY_WINDOW]
+                if not outliers(pd.Series(recent_supply), SUPPLY_JUMP_THRESHOLD).iloc[-1]:
+                    kpis[kpi] = amount
+            else:
+                kpis[kpi] += sign * float(row['amount']) / PRECISION
+        cursors[field] = int(rows[-1]['timestamp'])
+        instrumentation.LIVE_EVENTS.labels(field).inc(len(rows))
+
+    changes = {}
+    for kpi in ('supply', 'troves', 'sp_deposits', 'moor_staked'):
+        change = kpis[kpi] - before[kpi]
+        if change:
+            # The 2-week deltas move with the totals until the next rebase
+            kpis[f'{kpi}_delta'] += change
+            changes[kpi] = {'value': kpis[kpi], 'change': change}
+    # The APRs and staker rewards are computed over the whole window; they move with the snapshot
+    return changes
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class LiveFeed:
+    """Live KPI totals, rebased on each snapshot and advanced by tailed events"""
+
+    def __init__(self, mode='poll'):
+        self.mode = mode
+        self.kpis = None
+        self.cursors = {}
+        self.recent_supply = []
+        self.updated_at = None
+        self.clients = set()
+        # Snapshot to rebase on at the next tail
+        self.pending = None
+        # Created in run(), on the serving loop
+        self.wake = None
+
+    def rebase(self, snapshot):
+        """Queue a fresh snapshot; it replaces the totals once the events since it are applied"""
+        self.pending = snapshot
+        if self.wake is not None:
+            self.wake.set()
+
+    def state(self):
+        return {'updated_at': self.updated_at, 'kpis': self.kpis}
+
+    async def tail(self):
+        """Apply new events, rebasing first if a snapshot is pending, and notify clients"""
+        pending, self.pending = self.pending, None
+        if pending is not None:
+            kpis, cursors = dict(pending['kpis']), dict(pending['cursors'])
+            recent_supply = pending['frames']['supply']['amount'].tail(SUPPLY_WINDOW).tolist()
+        else:
+            kpis, cursors, recent_supply = self.kpis, self.cursors, self.recent_supply
+        try:
+            result = await asyncio.to_thread(fetch_tail, cursors)
+            troves = await asyncio.to_thread(active_troves)
+        except Exception:
+            if self.pending is None:
+                self.pending = pending
+            raise
+        changes = apply_events(kpis, cursors, result, troves, recent_supply)
+        self.recent_supply = recent_supply
+        if pending is None and not changes:
+            return
+        self.kpis, self.cursors = kpis, cursors
+        self.updated_at = datetime.now().isoformat()
+        if pending is not None:
+            self.publish(sse('state', self.state()))
+        else:
+            self.publish(sse('delta', {'updated_at': self.updated_at, 'changes': changes}))
+
+    def publish(self, message):
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind; drop it rather than buffer without bound
+                self.clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def stream(self):
+        """Server-Sent Events for one client: the current state, then each change"""
+        queue = asyncio.Queue(maxsize=LIVE_CLIENT_QUEUE)
+        self.clients.add(queue)
+        instrumentation.LIVE_CLIENTS.inc()
+        try:
+            yield sse('state', self.state())
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.clients.discard(queue)
+            instrumentation.LIVE_CLIENTS.dec()
+
+    async def run(self):
+        """Tail events until cancelled, woken by a subscription, a rebase or the poll interval"""
+        self.wake = asyncio.Event()
+        interval = LIVE_POLL_SECONDS
+        if self.mode == 'subscribe' and self.start_subscriptions():
+            interval = LIVE_SAFETY_POLL_SECONDS
+        timeout = interval
+        while True:
+            self.wake.clear()
+            try:
+                await self.tail()
+            except Exception:
+                logger.exception("Live tail failed; retrying")
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=timeout)
+                # The rows that woke it are applied once they are CURSOR_SAFETY_SECONDS old
+                timeout = min(interval, datasets.CURSOR_SAFETY_SECONDS + 1)
+            except asyncio.TimeoutError:
+                timeout = interval
+
+    def start_subscriptions(self):
+        try:
+            from gql.transport.websockets import WebsocketsTransport
+        except ImportError:
+            logger.warning("LIVE_MODE=subscribe needs the websockets package; polling instead")
+            return False
+        entities = {field: entity for field, (entity, _, _) in TAILED_FIELDS.items()}
+        for field, entity in {**entities, **TROVE_SUBSCRIPTIONS}.items():
+            asyncio.create_task(self.subscribe(WebsocketsTransport, field, entity))
+        return True
+
+    async def subscribe(self, transport_class, field, entity):
+        """Wake the tail whenever the entity's stream delivers rows; the tail applies them"""
+        document = gql(LIVE_STREAM_SUBSCRIPTION % entity)
+        while True:
+            try:
+                async with Client(transport=transport_class(url=LIVE_WS_URL)) as session:
+                    since = self.cursors.get(field, snapshot.collateral_ledger.cursors.get(field, 0))
+                    variables = {'since': since}
+                    try:
+                        from gql import GraphQLRequest
+                    except ImportError:  # gql 3
+                        updates = session.subscribe(document, variable_values=variables)
+                    else:
+                        updates = session.subscribe(GraphQLRequest(document, variable_values=variables))
+                    async for _ in updates:
+                        self.wake.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Subscription to %s dropped; reconnecting", entity)
+            await asyncio.sleep(LIVE_RECONNECT_SECONDS)
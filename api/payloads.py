@@ -0,0 +1,199 @@
+"""Pre-encoded response bodies with compression, ETags and conditional GETs.
+
+Series bodies are serialized once per snapshot generation, compressed once per
+content-coding and served as bytes. Each body carries a strong ETag hashed
+from its bytes and media type, so a client polling with ``If-None-Match`` gets
+a bodiless ``304 Not Modified`` until the data changes. A series keeps the
+``generated_at`` of the snapshot that first produced its current data, so an
+unchanged series keeps its bodies and ETags across refreshes.
+
+Series can also be requested as MessagePack or Arrow IPC stream, via
+``?format=msgpack|arrow`` or the matching ``Accept`` header, and downsampled
+to a point budget with ``?points=`` (see downsample.py), or over a time range
+and resolution with ``?start=&end=&resolution=`` (see ranges.py).
+"""
+import gzip
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi import HTTPException, Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Range views of a generation kept encoded; the least recently used go first
+MAX_RANGE_PAYLOADS = 64
+
+# Guards every snapshot's 'payloads' and 'range_payloads'
+_lock = threading.Lock()
+
+
+class Payload:
+    """One response body, compressed on first use per content-coding"""
+
+    def __init__(self, body, media_type):
+        self.body = body
+        self.media_type = media_type
+        self.tag = hashlib.sha256(media_type.encode() + b'\0' + body).hexdigest()[:20]
+        self._encoded = {None: body}
+
+    def etag(self, coding=None):
+        # A strong ETag must differ between content-codings of the same data
+        return f'"{self.tag}-{coding}"' if coding else f'"{self.tag}"'
+
+    def encoded(self, coding):
+        if coding not in self._encoded:
+            if coding == 'br':
+                self._encoded[coding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+            else:
+                self._encoded[coding] = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        return self._encoded[coding]
+
+    def matches(self, if_none_match):
+        """True if the client already holds this data, in any content-coding"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or any(tag.strip('"').split('-')[0] == self.tag for tag in tags)
+
+
+def negotiate_coding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def respond(request, payload):
+    """Serve a payload, compressed if the client accepts it, or 304 if it is unchanged"""
+    coding = None
+    if len(payload.body) >= MIN_COMPRESS_BYTES:
+        coding = negotiate_coding(request.headers.get('accept-encoding', ''))
+    headers = {
+        'ETag': payload.etag(coding),
+        'Vary': 'Accept, Accept-Encoding',
+        # Cacheable, but revalidated on every use
+        'Cache-Control': 'no-cache',
+    }
+    if payload.matches(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers['Content-Encoding'] = coding
+    return Response(content=payload.encoded(coding), media_type=payload.media_type, headers=headers)
+
+
+def json_payload(content):
+    return Payload(json.dumps(content, separators=(',', ':')).encode(), MEDIA_TYPES['json'])
+
+
+def requested_format(request):
+    """Series format from ?format= or the Accept header; JSON by default"""
+    fmt = request.query_params.get('format')
+    if fmt is None:
+        accept = request.headers.get('accept', '')
+        fmt = next((name for name, media_type in MEDIA_TYPES.items() if media_type in accept), 'json')
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}; use one of {', '.join(MEDIA_TYPES)}")
+    return fmt
+
+
+def encode_series(snapshot, name, fmt, points=None, y=None, window=None):
+    """Serialize one snapshot series in the given format, over `window` = (start, end, resolution)
+    if set, downsampled if `points` is set"""
+    generated_at = snapshot['series_generated_at'][name]
+    frame, data = snapshot['frames'][name], snapshot['series'][name]
+    if window is not None:
+        from ranges import range_series
+
+        frame = range_series(snapshot, name, *window)
+    if points is not None:
+        from downsample import downsample_series
+
+        frame = downsample_series(name, frame, points, y)
+    if window is not None or points is not None:
+        data = json.loads(frame.to_json(orient='records', date_format='iso'))
+    content = {'generated_at': generated_at, 'name': name, 'data': data}
+    if fmt == 'json':
+        return json_payload(content)
+    if fmt == 'msgpack':
+        import msgpack
+
+        return Payload(msgpack.packb(content), MEDIA_TYPES['msgpack'])
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({'generated_at': generated_at, 'name': name})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Payload(sink.getvalue(), MEDIA_TYPES['arrow'])
+
+
+def series_payload(snapshot, name, fmt='json', points=None, y=None, window=None):
+    """Encoded series for this snapshot generation, built on first request"""
+    # Range views are encoded on worker threads, so the caches are only touched under the lock;
+    # encoding happens outside it, and a body two threads built at once is kept once
+    if window is not None:
+        key = (name, fmt, points, y, window)
+        with _lock:
+            cache = snapshot.setdefault('range_payloads', OrderedDict())
+            payload = cache.get(key)
+            if payload is not None:
+                cache.move_to_end(key)
+                return payload
+        payload = encode_series(snapshot, name, fmt, points, y, window)
+        with _lock:
+            payload = cache.setdefault(key, payload)
+            cache.move_to_end(key)
+            while len(cache) > MAX_RANGE_PAYLOADS:
+                cache.popitem(last=False)
+        return payload
+    key = (name, fmt, points, y)
+    with _lock:
+        payload = snapshot.setdefault('payloads', {}).get(key)
+    if payload is None:
+        payload = encode_series(snapshot, name, fmt, points, y)
+        with _lock:
+            payload = snapshot['payloads'].setdefault(key, payload)
+    return payload
+
+
+def prepare(snapshot, previous=None):
+    """Serialize and compress every JSON series ahead of serving the snapshot; series whose
+    data is the same as in the `previous` snapshot keep its generated_at"""
+    stamps = snapshot['series_generated_at'] = {}
+    for name, data in snapshot['series'].items():
+        unchanged = previous is not None and previous['series'].get(name) == data
+        stamps[name] = previous['series_generated_at'][name] if unchanged else snapshot['generated_at']
+    for name in snapshot['series']:
+        payload = series_payload(snapshot, name)
+        payload.encoded('gzip')
+        if brotli is not None:
+            payload.encoded('br')
@@ -0,0 +1,112 @@
+"""Opt-in profiling for api requests, dashboard runs and reward jobs.
+
+Profiling is off unless enabled:
+
+- PROFILE_ENABLED=1 profiles a PROFILE_SAMPLE_RATE fraction (default 1.0) of runs
+- when PROFILE_TOKEN is set, a request carrying ``X-Profile: <token>`` or
+  ``?profile=<token>`` is always profiled
+
+PROFILER selects ``cprofile`` (deterministic, writes .pstats, the default) or
+``pyinstrument`` (sampling every PROFILE_INTERVAL seconds, writes an HTML
+flame view). Profiles are written to PROFILE_DIR. Api requests are always
+profiled with pyinstrument's async mode, which follows only the request's own
+task, so pyinstrument is in the api requirements; the dashboard needs it only
+with PROFILER=pyinstrument. cProfile would also record every other request
+the event loop runs in the meantime.
+
+dashboard/profiling.py is a symlink to this file; the dashboard image is built
+from the repository root so it can copy this module alongside.
+"""
+import hmac
+import logging
+import os
+import random
+import re
+import threading
+from datetime import datetime
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/moor-profiles')
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '1.0'))
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILER = os.getenv('PROFILER', 'cprofile')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.001'))
+
+# Only one profiler can be active per process; concurrent runs go unprofiled
+_active = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def should_profile(requested_token=None):
+    """Decide whether this run is profiled, from the token it carries or the sampling rate"""
+    if PROFILE_TOKEN and requested_token and hmac.compare_digest(requested_token, PROFILE_TOKEN):
+        return True
+    return PROFILE_ENABLED and random.random() < PROFILE_SAMPLE_RATE
+
+
+class Profile:
+    """Context manager profiling its block when enabled; ``path`` is set once the profile is written"""
+
+    def __init__(self, name, enabled=True, profiler=None):
+        self.name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'run'
+        self.enabled = enabled
+        self.profiler = profiler or PROFILER
+        self.path = None
+        self._profiler = None
+
+    def __enter__(self):
+        if not self.enabled or not _active.acquire(blocking=False):
+            self.enabled = False
+            return self
+        try:
+            if self.profiler == 'pyinstrument':
+                from pyinstrument import Profiler
+
+                self._profiler = Profiler(interval=PROFILE_INTERVAL, async_mode='enabled')
+                self._profiler.start()
+            else:
+                import cProfile
+
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+        except Exception:
+            _active.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stem = os.path.join(PROFILE_DIR, f"{self.name}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}")
+            if self.profiler == 'pyinstrument':
+                self._profiler.stop()
+                self.path = stem + '.html'
+                with open(self.path, 'w') as f:
+                    f.write(self._profiler.output_html())
+            else:
+                self._profiler.disable()
+                self.path = stem + '.pstats'
+                self._profiler.dump_stats(self.path)
+        finally:
+            _active.release()
+        return False
+
+
+async def profiling_middleware(request, call_next):
+    """Profile a request when sampled or when it carries the profiling token"""
+    token = request.headers.get('X-Profile') or request.query_params.get('profile')
+    if not should_profile(token):
+        return await call_next(request)
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        logger.warning("Profiling api requests needs pyinstrument; serving %s unprofiled", request.url.path)
+        return await call_next(request)
+    with Profile(f"api{request.url.path}", profiler='pyinstrument') as profile:
+        response = await call_next(request)
+    if profile.path:
+        response.headers['X-Profile-Path'] = profile.path
+    return response
@@ -1,8 +1,11 @@
 # GraphQL queries for Moor Analytics
 
+# The event queries below take the [$start, $end) timestamp range to fetch;
+# the snapshot passes the whole history, range views only the rows they show
 TOTAL_SUPPLY_QUERY = """
-    query {
+    query ($start: Int!, $end: Int!) {
         USDM_TotalSupplyEvent(
+            where: {timestamp: {_gte: $start, _lt: $end}},
             order_by: {timestamp: asc}
         ) {
             amount
@@ -13,8 +16,9 @@ TOTAL_SUPPLY_QUERY = """
 
 MINT_BURN_QUERIES = {
     "mint": """
-        query {
+        query ($start: Int!, $end: Int!) {
             USDM_Mint(
+                where: {timestamp: {_gte: $start, _lt: $end}},
                 order_by: {timestamp: asc}
             ) {
                 amount
@@ -23,8 +27,9 @@ MINT_BURN_QUERIES = {
         }
     """,
     "burn": """
-        query {
+        query ($start: Int!, $end: Int!) {
             USDM_Burn(
+                where: {timestamp: {_gte: $start, _lt: $end}},
                 order_by: {timestamp: asc}
             ) {
                 amount
@@ -34,77 +39,218 @@ MINT_BURN_QUERIES = {
     """
 }
 
-TROVE_EVENTS_QUERY = """
-    query {
-        open: BorrowOperations_OpenTroveEvent(order_by: {timestamp: asc}) {
+# Stakes, unstakes and mints newer than each field's cursor, for the staking
+# ledger; the field names match LIVE_TAIL_QUERY so the cursors carry over
+STAKING_LEDGER_QUERY = """
+    query StakingLedger($stakes: Int!, $unstakes: Int!, $mints: Int!) {
+        stakes: MoorStaking_StakeEvent(where: {timestamp: {_gt: $stakes}}, order_by: {timestamp: asc}) {
             identity
-            asset
+            amount
             timestamp
         }
-        close: BorrowOperations_CloseTroveEvent(order_by: {timestamp: asc}) {
+        unstakes: MoorStaking_UnstakeEvent(where: {timestamp: {_gt: $unstakes}}, order_by: {timestamp: asc}) {
             identity
-            asset
+            amount
             timestamp
         }
-        liquidation_full: TroveManager_TroveFullLiquidationEvent(order_by: {timestamp: asc}) {
-            identity
-            asset
+        mints: USDM_Mint(where: {timestamp: {_gt: $mints}}, order_by: {timestamp: asc}) {
+            amount
             timestamp
         }
     }
 """
 
-MOOR_STAKING_QUERY = """
-    query {
-        stakes: MoorStaking_StakeEvent(order_by: {timestamp: asc}) {
+STABILITY_POOL_QUERY = """
+    query ($start: Int!, $end: Int!) {
+        deposits: StabilityPool_ProvideToStabilityPoolEvent(where: {timestamp: {_gte: $start, _lt: $end}}, order_by: {timestamp: asc}) {
             amount
             timestamp
         }
-        unstakes: MoorStaking_UnstakeEvent(order_by: {timestamp: asc}) {
+        withdrawals: StabilityPool_WithdrawFromStabilityPoolEvent(where: {timestamp: {_gte: $start, _lt: $end}}, order_by: {timestamp: asc}) {
             amount
             timestamp
         }
     }
 """
 
-STABILITY_POOL_QUERY = """
-    query {
-        deposits: StabilityPool_ProvideToStabilityPoolEvent(order_by: {timestamp: asc}) {
+REDEMPTION_QUERY = """
+    query ($start: Int!, $end: Int!) {
+        TroveManager_RedemptionEvent(where: {timestamp: {_gte: $start, _lt: $end}}, order_by: {timestamp: asc}) {
+            asset
+            usdm_amount
+            collateral_amount
+            collateral_price
+            timestamp
+        }
+    }
+"""
+
+LIQUIDATION_QUERY = """
+    query ($start: Int!, $end: Int!) {
+        full: TroveManager_TroveFullLiquidationEvent(where: {timestamp: {_gte: $start, _lt: $end}}, order_by: {timestamp: asc}) {
+            asset
+            debt
+            collateral
+            timestamp
+        }
+        partial: TroveManager_TrovePartialLiquidationEvent(where: {timestamp: {_gte: $start, _lt: $end}}, order_by: {timestamp: asc}) {
+            asset
+            remaining_debt
+            remaining_collateral
+            timestamp
+        }
+    }
+""" 
+# Events newer than each field's cursor (live mode); field names match the
+# snapshot queries above so their cursors carry over
+LIVE_TAIL_QUERY = """
+    query LiveTail($USDM_TotalSupplyEvent: Int!, $deposits: Int!, $withdrawals: Int!,
+                   $stakes: Int!, $unstakes: Int!) {
+        USDM_TotalSupplyEvent(where: {timestamp: {_gt: $USDM_TotalSupplyEvent}}, order_by: {timestamp: asc}) {
+            amount
+            timestamp
+        }
+        deposits: StabilityPool_ProvideToStabilityPoolEvent(where: {timestamp: {_gt: $deposits}}, order_by: {timestamp: asc}) {
             amount
             timestamp
         }
-        withdrawals: StabilityPool_WithdrawFromStabilityPoolEvent(order_by: {timestamp: asc}) {
+        withdrawals: StabilityPool_WithdrawFromStabilityPoolEvent(where: {timestamp: {_gt: $withdrawals}}, order_by: {timestamp: asc}) {
+            amount
+            timestamp
+        }
+        stakes: MoorStaking_StakeEvent(where: {timestamp: {_gt: $stakes}}, order_by: {timestamp: asc}) {
+            amount
+            timestamp
+        }
+        unstakes: MoorStaking_UnstakeEvent(where: {timestamp: {_gt: $unstakes}}, order_by: {timestamp: asc}) {
             amount
             timestamp
         }
     }
 """
 
-REDEMPTION_QUERY = """
-    query {
-        TroveManager_RedemptionEvent(order_by: {timestamp: asc}) {
+# Hasura streaming subscription used in live mode only to learn that an entity
+# has new rows; %s is the entity name
+LIVE_STREAM_SUBSCRIPTION = """
+    subscription ($since: Int!) {
+        %s_stream(batch_size: 100, cursor: {initial_value: {timestamp: $since}, ordering: ASC}) {
+            timestamp
+        }
+    }
+"""
+
+# Every identity-bearing event newer than each field's cursor, for the
+# per-wallet index
+WALLET_EVENTS_QUERY = """
+    query WalletEvents($opens: Int!, $adjusts: Int!, $closes: Int!, $liquidations: Int!,
+                       $partial_liquidations: Int!, $redemptions: Int!, $deposits: Int!,
+                       $withdrawals: Int!, $stakes: Int!, $unstakes: Int!) {
+        opens: BorrowOperations_OpenTroveEvent(where: {timestamp: {_gt: $opens}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            collateral
+            debt
+            timestamp
+        }
+        adjusts: BorrowOperations_AdjustTroveEvent(where: {timestamp: {_gt: $adjusts}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            collateral
+            debt
+            timestamp
+        }
+        closes: BorrowOperations_CloseTroveEvent(where: {timestamp: {_gt: $closes}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            timestamp
+        }
+        liquidations: TroveManager_TroveFullLiquidationEvent(where: {timestamp: {_gt: $liquidations}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            timestamp
+        }
+        partial_liquidations: TroveManager_TrovePartialLiquidationEvent(where: {timestamp: {_gt: $partial_liquidations}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            remaining_collateral
+            remaining_debt
+            timestamp
+        }
+        redemptions: TroveManager_RedemptionEvent(where: {timestamp: {_gt: $redemptions}}, order_by: {timestamp: asc}) {
+            identity
             asset
-            usdm_amount
             collateral_amount
-            collateral_price
+            usdm_amount
+            timestamp
+        }
+        deposits: StabilityPool_ProvideToStabilityPoolEvent(where: {timestamp: {_gt: $deposits}}, order_by: {timestamp: asc}) {
+            identity
+            amount
+            compounded_amount
+            timestamp
+        }
+        withdrawals: StabilityPool_WithdrawFromStabilityPoolEvent(where: {timestamp: {_gt: $withdrawals}}, order_by: {timestamp: asc}) {
+            identity
+            amount
+            compounded_amount
+            timestamp
+        }
+        stakes: MoorStaking_StakeEvent(where: {timestamp: {_gt: $stakes}}, order_by: {timestamp: asc}) {
+            identity
+            amount
+            timestamp
+        }
+        unstakes: MoorStaking_UnstakeEvent(where: {timestamp: {_gt: $unstakes}}, order_by: {timestamp: asc}) {
+            identity
+            amount
             timestamp
         }
     }
 """
 
-LIQUIDATION_QUERY = """
-    query {
-        full: TroveManager_TroveFullLiquidationEvent(order_by: {timestamp: asc}) {
+# Every event that changes a trove's collateral or debt, newer than each
+# field's cursor, for the collateral and debt totals
+TROVE_STATE_QUERY = """
+    query TroveState($opens: Int!, $adjusts: Int!, $closes: Int!, $liquidations: Int!,
+                     $partial_liquidations: Int!, $redemptions: Int!) {
+        opens: BorrowOperations_OpenTroveEvent(where: {timestamp: {_gt: $opens}}, order_by: {timestamp: asc}) {
+            identity
             asset
+            collateral
             debt
+            timestamp
+        }
+        adjusts: BorrowOperations_AdjustTroveEvent(where: {timestamp: {_gt: $adjusts}}, order_by: {timestamp: asc}) {
+            identity
+            asset
             collateral
+            debt
             timestamp
         }
-        partial: TroveManager_TrovePartialLiquidationEvent(order_by: {timestamp: asc}) {
+        closes: BorrowOperations_CloseTroveEvent(where: {timestamp: {_gt: $closes}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            timestamp
+        }
+        liquidations: TroveManager_TroveFullLiquidationEvent(where: {timestamp: {_gt: $liquidations}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            timestamp
+        }
+        partial_liquidations: TroveManager_TrovePartialLiquidationEvent(where: {timestamp: {_gt: $partial_liquidations}}, order_by: {timestamp: asc}) {
+            identity
             asset
-            remaining_debt
             remaining_collateral
+            remaining_debt
+            timestamp
+        }
+        redemptions: TroveManager_RedemptionEvent(where: {timestamp: {_gt: $redemptions}}, order_by: {timestamp: asc}) {
+            identity
+            asset
+            collateral_amount
+            usdm_amount
+            collateral_price
             timestamp
         }
     }
-""" 
\ No newline at end of file
+"""
@@ -0,0 +1,83 @@
+"""Series and KPIs for a chosen time range and resolution.
+
+The snapshot holds every series over the whole history at daily resolution, so
+a daily range view is a slice of it. At any other resolution the event series
+are fetched again with the range pushed into the queries' ``where`` clause, so
+only the events in range are transferred and aggregated; the series backed by
+a ledger (troves, collateral, MOOR staking) are sampled from it in memory, and
+supply is already one row per event.
+"""
+import pandas as pd
+
+import datasets
+import snapshot
+from collateral import bucket_range, bucket_step
+
+DAY = pd.Timedelta('1D')
+
+
+def timestamp(value):
+    """A naive UTC pandas Timestamp, like the series' timestamps, or None"""
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_convert(None) if value.tz is not None else value
+
+
+def fetch_range(name, start, end):
+    """Decoded events of dataset `name` from `start` through `end` only"""
+    return datasets.fetch_dataset(name, int(start.timestamp()), int(end.timestamp()) + 1)
+
+
+def range_series(current, name, start=None, end=None, freq='1D'):
+    """Series `name` from the bucket holding `start` through `end` at resolution `freq`;
+    from the series' first row to now by default"""
+    step = bucket_step(freq)
+    frame = current['frames'][name]
+    start, end = timestamp(start), timestamp(end)
+    end = end if end is not None else pd.Timestamp.now()
+    if start is None:
+        if frame.empty:
+            return frame
+        start = frame['timestamp'].min()
+    if start >= end:
+        raise ValueError("start must be before end")
+    # Validates the bucket count before anything is fetched
+    first = bucket_range(start, end, step)[0]
+
+    if name in ('troves', 'collateral'):
+        df = snapshot.collateral_ledger.series(freq, start, end)
+        return df[['timestamp', 'asset', 'active_troves']] if name == 'troves' else df
+    if name == 'moor_staking':
+        return snapshot.staking_ledger.series(freq, start, end)
+    if name == 'supply':
+        return frame[(frame['timestamp'] >= start) & (frame['timestamp'] <= end)]
+    if step == DAY or name not in ('mint_burn', 'stability_pool', 'redemptions', 'liquidations'):
+        return frame[(frame['timestamp'] >= first) & (frame['timestamp'] <= end)]
+
+    if name == 'mint_burn':
+        return snapshot.mint_burn_frame(fetch_range('mint', first, end),
+                                        fetch_range('burn', first, end), freq)
+    if name == 'redemptions':
+        return snapshot.redemption_frame(fetch_range('redemptions', first, end), freq)
+    if name == 'liquidations':
+        return snapshot.liquidation_frame(fetch_range('liquidations', first, end), freq)
+    # The running total starts from the snapshot's total at the end of the previous day,
+    # so the events are fetched from the start of the first bucket's day
+    day = first.floor(DAY)
+    before = frame[frame['timestamp'] < day]
+    baseline = float(before['total_deposited'].iloc[-1]) if not before.empty else 0.0
+    df = snapshot.stability_pool_frame(
+        fetch_range('stability_pool', day, end), freq, baseline)
+    return df[df['timestamp'] >= first]
+
+
+def range_kpis(current, start=None, end=None):
+    """KPI card values with deltas over (start, end]; the whole history up to now by default"""
+    start, end = timestamp(start), timestamp(end)
+    end = end if end is not None else pd.Timestamp.now()
+    start = start if start is not None else pd.Timestamp(0)
+    if start >= end:
+        raise ValueError("start must be before end")
+    kpis = snapshot.compute_kpis(current['frames'], snapshot.staking_ledger, end, start)
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'kpis': kpis}
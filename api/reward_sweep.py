@@ -0,0 +1,132 @@
+"""What-if reward allocations for many pool configurations at once.
+
+Trove events are fetched and replayed once, for every asset, into a matrix of
+time-weighted collateral per identity and asset; each scenario is then only a
+column selection, cutoff and re-normalization of that matrix, so dozens of
+scenarios cost about as much as one rewards_script.py run.
+
+    python reward_sweep.py scenarios.json
+
+Scenarios are a JSON list. Every key is optional and defaults to the campaign
+in rewards_script.py; ``min_weight`` drops (identity, asset) pairs whose
+time-averaged collateral over the window is below it:
+
+    [
+        {"name": "current"},
+        {"name": "eth-40", "shares": {"ETH": 0.4, "FUEL": 0.6}},
+        {"name": "2M", "total_rewards": 2000000},
+        {"name": "with-BTC", "shares": {"ETH": 0.4, "FUEL": 0.4, "BTC": 0.2}},
+        {"name": "min-100", "min_weight": 100}
+    ]
+
+The first scenario is the reference for the ``max_change`` column.
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+import datasets
+from profiling import Profile, should_profile
+from rewards_script import (
+    ASSET_SHARES,
+    GRAPHQL_URL,
+    TOTAL_REWARDS,
+    build_trove_periods,
+    clamp_periods,
+    compute_weights,
+    fetch_trove_events,
+)
+
+
+def load_scenarios(path):
+    with open(path) as f:
+        scenarios = json.load(f)
+    return [
+        {
+            'name': scenario.get('name', f"scenario-{i + 1}"),
+            'total_rewards': float(scenario.get('total_rewards', TOTAL_REWARDS)),
+            'shares': scenario.get('shares', ASSET_SHARES),
+            'min_weight': float(scenario.get('min_weight', 0.0)),
+        }
+        for i, scenario in enumerate(scenarios)
+    ]
+
+
+def weight_matrix(weights):
+    """{asset: {identity: weight}} as a DataFrame with one row per identity, one column per asset"""
+    return pd.DataFrame(weights).fillna(0.0)
+
+
+def evaluate(matrix, total_rewards=TOTAL_REWARDS, shares=ASSET_SHARES, min_weight=0.0):
+    """Rewards per identity for one pool configuration"""
+    columns = matrix.reindex(columns=list(shares), fill_value=0.0)
+    if min_weight:
+        columns = columns.where(columns >= min_weight, 0.0)
+    totals = columns.sum()
+    pools = pd.Series(shares, dtype=float) * total_rewards
+    # An asset nobody holds distributes nothing
+    per_unit_weight = (pools / totals).where(totals > 0, 0.0)
+    return columns.mul(per_unit_weight, axis=1).sum(axis=1)
+
+
+def summarize(scenario, rewards, reference):
+    recipients = rewards[rewards > 0]
+    distributed = recipients.sum()
+    return {
+        'scenario': scenario['name'],
+        'total_rewards': scenario['total_rewards'],
+        'shares': ', '.join(f"{asset}={share:g}" for asset, share in scenario['shares'].items()),
+        'min_weight': scenario['min_weight'],
+        'recipients': len(recipients),
+        'distributed': distributed,
+        'undistributed': scenario['total_rewards'] * sum(scenario['shares'].values()) - distributed,
+        'max_reward': recipients.max() if len(recipients) else 0.0,
+        'median_reward': recipients.median() if len(recipients) else 0.0,
+        'top10_pct': 100 * recipients.nlargest(10).sum() / distributed if distributed else 0.0,
+        'max_change': (rewards - reference).abs().max(),
+    }
+
+
+def sweep(matrix, scenarios):
+    """Evaluate every scenario; return the comparison table and per-wallet rewards"""
+    per_wallet = pd.DataFrame({
+        scenario['name']: evaluate(matrix, scenario['total_rewards'], scenario['shares'], scenario['min_weight'])
+        for scenario in scenarios
+    })
+    reference = per_wallet.iloc[:, 0]
+    summary = pd.DataFrame([summarize(scenario, per_wallet[scenario['name']], reference) for scenario in scenarios])
+    return summary, per_wallet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reward allocations across pool configurations")
+    parser.add_argument('scenarios', help="JSON list of scenarios (see module docstring)")
+    parser.add_argument('--summary', default='reward_sweep.csv', help="Comparison table output")
+    parser.add_argument('--wallets', default='reward_sweep_wallets.csv', help="Per-wallet rewards per scenario")
+    args = parser.parse_args()
+    scenarios = load_scenarios(args.scenarios)
+
+    started = time.perf_counter()
+    # Every asset, so scenarios can add assets to the campaign
+    troves = clamp_periods(build_trove_periods(fetch_trove_events(assets=None)))
+    matrix = weight_matrix(compute_weights(troves))
+    replayed = time.perf_counter()
+    summary, per_wallet = sweep(matrix, scenarios)
+    evaluated = time.perf_counter()
+
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+    print(f"\nFetch and replay: {replayed - started:.2f}s; "
+          f"{len(scenarios)} scenarios evaluated in {evaluated - replayed:.3f}s")
+    summary.to_csv(args.summary, index=False)
+    per_wallet.rename_axis('wallet').to_csv(args.wallets, float_format='%.9f')
+    print(f"Saved {args.summary} and {args.wallets}")
+
+
+if __name__ == "__main__":
+    datasets.configure(GRAPHQL_URL)
+    with Profile('reward_sweep', should_profile()) as profile:
+        main()
+    if profile.path:
+        print(f"Profile written to {profile.path}")
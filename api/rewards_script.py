@@ -1,15 +1,18 @@
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from gql import gql
 import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 import os
+import datasets
+from datasets import PRECISION
+from profiling import Profile, should_profile
 
 # Constants
 GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'https://stats.fluidprotocol.xyz/v1/graphql')
 TOTAL_REWARDS = 1_800_000 # 1,800,000 FUEL
 ETH_SHARE = 0.45
 FUEL_SHARE = 0.55
-PRECISION = 1e9
+ASSET_SHARES = {'ETH': ETH_SHARE, 'FUEL': FUEL_SHARE}
 
 
 # Debug output for specific user
@@ -21,75 +24,96 @@ START_DATE = datetime(2025, 1, 15).timestamp()
 END_DATE = datetime(2025, 3, 1).timestamp()
 TOTAL_PERIOD = END_DATE - START_DATE
 
-# Set up GraphQL client
-transport = RequestsHTTPTransport(url=GRAPHQL_URL)
-client = Client(transport=transport, fetch_schema_from_transport=False)
+# Trove event root fields: entity and selected columns. Each is fetched as its own
+# request (per asset too), so the server evaluates them concurrently and the fetch
+# takes as long as the largest table rather than all of them in turn
+TROVE_EVENT_ENTITIES = {
+    'opens': ('BorrowOperations_OpenTroveEvent', ['identity', 'asset', 'collateral', 'timestamp']),
+    'closes': ('BorrowOperations_CloseTroveEvent', ['identity', 'asset', 'timestamp']),
+    'adjusts': ('BorrowOperations_AdjustTroveEvent',
+                ['identity', 'asset', 'collateral', 'collateralChange', 'isCollateralIncrease', 'timestamp']),
+    'liquidations': ('TroveManager_TroveFullLiquidationEvent', ['identity', 'asset', 'timestamp']),
+    'partial_liquidations': ('TroveManager_TrovePartialLiquidationEvent',
+                             ['identity', 'asset', 'remaining_collateral', 'timestamp']),
+    'redemptions': ('TroveManager_RedemptionEvent', ['identity', 'asset', 'collateral_amount', 'timestamp']),
+}
 
-# Query to get all relevant trove events
-TROVE_EVENTS_QUERY = """
+# Query for one trove event root field; WHERE, ORDER and PAGE are filled in by trove_event_query
+TROVE_EVENT_QUERY_TEMPLATE = """
 query {
-    opens: BorrowOperations_OpenTroveEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
-    ) {
-        identity
-        asset
-        collateral
-        timestamp
-    }
-    closes: BorrowOperations_CloseTroveEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
-    ) {
-        identity
-        asset
-        timestamp
-    }
-    adjusts: BorrowOperations_AdjustTroveEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
-    ) {
-        identity
-        asset
-        collateral
-        collateralChange
-        isCollateralIncrease
-        timestamp
-    }
-    liquidations: TroveManager_TroveFullLiquidationEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
+    FIELD: ENTITY(
+        where: {WHERE}
+        order_by: ORDER
+        PAGE
     ) {
-        identity
-        asset
-        timestamp
-    }
-    partial_liquidations: TroveManager_TrovePartialLiquidationEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
-    ) {
-        identity
-        asset
-        remaining_collateral
-        timestamp
-    }
-    redemptions: TroveManager_RedemptionEvent(
-        where: {timestamp: {_lte: %d}, asset: {_in: ["FUEL", "ETH"]}}
-        order_by: {timestamp: asc}
-    ) {
-        identity
-        asset
-        collateral_amount
-        timestamp
+        COLUMNS
     }
 }
-""" % (END_DATE, END_DATE, END_DATE, END_DATE, END_DATE, END_DATE)
+"""
 
+# Assets in the reward campaign
+REWARD_ASSETS = ["FUEL", "ETH"]
 
-def calculate_rewards():
-    # Fetch all events
-    result = client.execute(gql(TROVE_EVENTS_QUERY))
-    
+# Requests in flight at once; beyond CLIENT_POOL_SIZE they also wait for a pooled client
+REWARDS_FETCH_CONCURRENCY = int(os.getenv('REWARDS_FETCH_CONCURRENCY', datasets.CLIENT_POOL_SIZE))
+# Rows per request, paged with limit/offset; 0 fetches each root field in one response
+REWARDS_PAGE_SIZE = int(os.getenv('REWARDS_PAGE_SIZE', 0))
+
+
+def trove_event_query(field, asset=None, offset=0, page_size=0):
+    """Events of one trove event root field up to END_DATE, for one asset or every asset if None,
+    one page of `page_size` rows from `offset` if `page_size` is set"""
+    entity, columns = TROVE_EVENT_ENTITIES[field]
+    where = "timestamp: {_lte: %d}" % END_DATE
+    if asset:
+        where += ', asset: {_eq: "%s"}' % asset
+    # Pages need a total order, or rows sharing a timestamp could be skipped or repeated
+    order = "[{timestamp: asc}, {id: asc}]" if page_size else "{timestamp: asc}"
+    page = "limit: %d, offset: %d" % (page_size, offset) if page_size else ""
+    return (TROVE_EVENT_QUERY_TEMPLATE.replace("FIELD", field).replace("ENTITY", entity)
+            .replace("WHERE", where).replace("ORDER", order).replace("PAGE", page)
+            .replace("COLUMNS", "\n        ".join(columns)))
+
+
+def fetch_trove_event_rows(field, asset=None, offset=0, page_size=0):
+    return datasets.execute(gql(trove_event_query(field, asset, offset, page_size)),
+                            f"rewards_{field}")[field]
+
+
+def fetch_trove_events(assets=REWARD_ASSETS, page_size=REWARDS_PAGE_SIZE, concurrency=REWARDS_FETCH_CONCURRENCY):
+    """Fetch every trove event up to END_DATE, for all assets if `assets` is None.
+
+    Every (root field, asset) pair is its own request, at most `concurrency` at a time; each
+    response is parsed on its worker thread as it arrives, and the next page of a paged pair is
+    requested as soon as the previous one completes. Returns {field: events in timestamp order}.
+    """
+    streams = [(field, asset) for field in TROVE_EVENT_ENTITIES for asset in (assets or [None])]
+    rows = {stream: [] for stream in streams}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def submit(stream, offset):
+            future = executor.submit(fetch_trove_event_rows, *stream, offset, page_size)
+            pending[future] = (stream, offset)
+
+        pending = {}
+        for stream in streams:
+            submit(stream, 0)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stream, offset = pending.pop(future)
+                page = future.result()
+                rows[stream].extend(page)
+                if page_size and len(page) == page_size:
+                    submit(stream, offset + page_size)
+
+    # Per asset each field is already in timestamp order; a stable sort interleaves the assets
+    return {field: sorted((event for asset in (assets or [None]) for event in rows[(field, asset)]),
+                          key=lambda event: int(event['timestamp']))
+            for field in TROVE_EVENT_ENTITIES}
+
+
+def build_trove_periods(result):
+    """Replay trove events into collateral periods per (identity, asset)"""
     # Initialize DataFrames for tracking trove states
     troves = {}  # Dictionary to track trove states: {(identity, asset): [(start_time, end_time, collateral)]}
     
@@ -191,7 +215,11 @@ def calculate_rewards():
                             'collateral': new_collateral
                         })
                         break
-    
+
+    return troves
+
+
+def print_debug_periods(troves):
     # debug periods print out for user
     print(f"\nFinal processed trove periods for {DEBUG_WALLET}:")
     if (DEBUG_WALLET, DEBUG_ASSET) in troves:
@@ -203,7 +231,9 @@ def calculate_rewards():
             print("---")
     else:
         print(f"No {DEBUG_ASSET} trove periods found after processing")
-    
+
+
+def clamp_periods(troves):
     # Filter out troves that lie fully before/after our reward window AND clamp them to the window
     for key in list(troves.keys()):
         clamped_periods = []
@@ -226,10 +256,13 @@ def calculate_rewards():
         troves[key] = clamped_periods
         if not troves[key]:
             del troves[key]
-    
+    return troves
+
+
+def compute_weights(troves):
+    """Time-weighted collateral per asset and identity: {asset: {identity: weight}}"""
     # Calculate time-weighted collateral for each asset
-    eth_weights = {}
-    fuel_weights = {}
+    weights = {}
     
     for (identity, asset), periods in troves.items():
         total_weighted_collateral = 0
@@ -250,38 +283,32 @@ def calculate_rewards():
                 total_weighted_collateral += weighted_collateral
         
         if total_weighted_collateral > 0:
-            if asset == 'ETH':
-                eth_weights[identity] = total_weighted_collateral
-            elif asset == 'FUEL':
-                fuel_weights[identity] = total_weighted_collateral
-    
-    # Calculate rewards
-    eth_total_weight = sum(eth_weights.values())
-    fuel_total_weight = sum(fuel_weights.values())
-    
-    eth_rewards = {
-        identity: (weight / eth_total_weight) * (TOTAL_REWARDS * ETH_SHARE)
-        for identity, weight in eth_weights.items()
-    }
-    
-    fuel_rewards = {
-        identity: (weight / fuel_total_weight) * (TOTAL_REWARDS * FUEL_SHARE)
-        for identity, weight in fuel_weights.items()
-    }
-    
-    # Combine rewards
+            weights.setdefault(asset, {})[identity] = total_weighted_collateral
+
+    return weights
+
+
+def allocate(weights, total_rewards=TOTAL_REWARDS, shares=ASSET_SHARES):
+    """Split each asset's share of the rewards pro rata to weight: {identity: amount}"""
     all_rewards = {}
-    for identity in set(list(eth_rewards.keys()) + list(fuel_rewards.keys())):
-        all_rewards[identity] = eth_rewards.get(identity, 0) + fuel_rewards.get(identity, 0)
-    
-    # Create DataFrame and save to CSV
+    for asset, share in shares.items():
+        asset_weights = weights.get(asset, {})
+        asset_total_weight = sum(asset_weights.values())
+        for identity, weight in asset_weights.items():
+            all_rewards[identity] = all_rewards.get(identity, 0) + (weight / asset_total_weight) * (total_rewards * share)
+    return all_rewards
+
+
+def rewards_frame(all_rewards):
+    """Rewards as a DataFrame floored to 9 decimals, largest first"""
     rewards_df = pd.DataFrame([
         {'wallet': wallet, 'amount': (amount * 1e9 // 1) / 1e9}  # Floor to 9 decimal places
         for wallet, amount in all_rewards.items()
     ])
-    
+    return rewards_df.sort_values('amount', ascending=False)
 
-    
+
+def print_debug_events(result, troves):
     # Debug raw events for this wallet
     print(f"\nDEBUG RAW EVENTS for {DEBUG_WALLET}:")
     print("\nOpen events:")
@@ -353,13 +380,25 @@ def calculate_rewards():
     print(f"\nChecking if periods fall within reward window:")
     print(f"Reward window start: {datetime.fromtimestamp(START_DATE)}")
     print(f"Reward window end: {datetime.fromtimestamp(END_DATE)}")
-    
-    # Sort rewards in descending order
-    rewards_df = rewards_df.sort_values('amount', ascending=False)
-    
+
+
+def calculate_rewards():
+    # Fetch all events
+    result = fetch_trove_events()
+    troves = build_trove_periods(result)
+    print_debug_periods(troves)
+    clamp_periods(troves)
+    rewards_df = rewards_frame(allocate(compute_weights(troves)))
+    print_debug_events(result, troves)
+
     rewards_df.to_csv('trove_rewards.csv', index=False, float_format='%.9f')  # Format with 9 decimal places
     print(f"Rewards calculated and saved to trove_rewards.csv")
     print(f"Total rewards distributed: {rewards_df['amount'].sum():,.9f}")
 
 if __name__ == "__main__":
-    calculate_rewards()
+    # Only as a script: the API imports this module and keeps its own upstream
+    datasets.configure(GRAPHQL_URL)
+    with Profile('rewards', should_profile()) as profile:
+        calculate_rewards()
+    if profile.path:
+        print(f"Profile written to {profile.path}")
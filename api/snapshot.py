@@ -0,0 +1,262 @@
+"""Precomputed dashboard metrics.
+
+The dashboard's KPI cards and charts are computed here once per refresh
+interval and served from memory, instead of being recomputed per viewer.
+"""
+import json
+from datetime import datetime
+
+import pandas as pd
+
+import datasets
+from instrumentation import transform_timer
+from collateral import load_ledger
+from downsample import outliers
+from staking import STAKER_MINT_SHARE, StakingLedger
+
+SUPPLY_JUMP_THRESHOLD = 200_000
+KPI_WINDOW = pd.Timedelta(days=14)
+
+# Newest event timestamp per root field seen so far; live mode tails each
+# field from here so the events it applies are exactly those after the snapshot
+cursors = {}
+
+# Per-staker MOOR stake; each refresh applies only the events since the last
+staking_ledger = StakingLedger()
+# Per-trove state with per-asset active troves, collateral and debt, advanced the same way
+collateral_ledger = load_ledger()
+
+
+def fetch(name):
+    """Fetch a dataset over the whole history up to CURSOR_SAFETY_SECONDS before the upstream
+    was queried, advancing the per-field cursors"""
+    frames = datasets.settled(datasets.fetch_dataset(name))
+    for field, df in frames.items():
+        if not df.empty:
+            # Every dataset query orders by timestamp ascending
+            cursors[field] = max(cursors.get(field, 0), int(df['timestamp'].iloc[-1].timestamp()))
+    return frames
+
+
+def bucket_sum(df, freq='1D'):
+    """Sum amounts per `freq` bucket, calendar days by default"""
+    if df.empty:
+        return pd.DataFrame(columns=['timestamp', 'amount'])
+    return df.groupby(df['timestamp'].dt.floor(freq))['amount'].sum().reset_index()
+
+
+def supply_frame(frames):
+    """USDM total supply events, dropping glitches far from the surrounding values"""
+    df = frames['USDM_TotalSupplyEvent']
+    with transform_timer('supply', 'aggregate'):
+        return df[~outliers(df['amount'], SUPPLY_JUMP_THRESHOLD)]
+
+
+def mint_burn_frame(mint_frames, burn_frames, freq='1D'):
+    """USDM mints and burns per `freq` bucket; burns are negative"""
+    with transform_timer('mint_burn', 'aggregate'):
+        mint_df = bucket_sum(mint_frames['USDM_Mint'], freq)
+        burn_df = bucket_sum(burn_frames['USDM_Burn'], freq)
+        mint_df['type'] = 'Mint'
+        burn_df['type'] = 'Burn'
+        burn_df['amount'] = -burn_df['amount']
+        return pd.concat([mint_df, burn_df])
+
+
+def stability_pool_frame(frames, freq='1D', baseline=0.0):
+    """Stability Pool deposits/withdrawals per `freq` bucket with the running total deposited,
+    starting from `baseline`, the total before the first event in `frames`"""
+    with transform_timer('stability_pool', 'aggregate'):
+        deposits_df = bucket_sum(frames['deposits'], freq)
+        withdrawals_df = bucket_sum(frames['withdrawals'], freq)
+        deposits_df['type'] = 'Deposit'
+        withdrawals_df['type'] = 'Withdrawal'
+        withdrawals_df['amount'] = -withdrawals_df['amount']
+
+        combined_df = pd.concat([deposits_df, withdrawals_df]).sort_values('timestamp')
+        combined_df['total_deposited'] = baseline + combined_df['amount'].cumsum()
+        return combined_df
+
+
+def redemption_frame(frames, freq='1D'):
+    """Redemption events aggregated per `freq` bucket and asset"""
+    df = frames['TroveManager_RedemptionEvent']
+
+    if df.empty:
+        return pd.DataFrame(columns=['timestamp', 'asset', 'usdm_amount',
+                                     'collateral_amount', 'redemption_rate'])
+
+    with transform_timer('redemptions', 'aggregate'):
+        redemptions = df.groupby([df['timestamp'].dt.floor(freq), 'asset']).agg({
+            'usdm_amount': 'sum',
+            'collateral_amount': 'sum'
+        }).reset_index()
+        redemptions['redemption_rate'] = (
+            redemptions['collateral_amount'] / redemptions['usdm_amount']
+        )
+        return redemptions
+
+
+def liquidation_frame(frames, freq='1D'):
+    """Full and partial liquidations aggregated per `freq` bucket, asset and type"""
+    full_df = frames['full'].assign(type='Full')
+    partial_df = frames['partial'].rename(
+        columns={'remaining_debt': 'debt', 'remaining_collateral': 'collateral'}).assign(type='Partial')
+
+    if full_df.empty and partial_df.empty:
+        return pd.DataFrame(columns=['timestamp', 'asset', 'type', 'debt', 'collateral'])
+
+    with transform_timer('liquidations', 'aggregate'):
+        liquidation_df = pd.concat([full_df, partial_df])
+        return liquidation_df.groupby(
+            [liquidation_df['timestamp'].dt.floor(freq), 'asset', 'type']
+        ).agg({
+            'debt': 'sum',
+            'collateral': 'sum'
+        }).reset_index()
+
+
+def fetch_supply_data():
+    """Fetch USDM total supply events, dropping glitches far from the surrounding values"""
+    return supply_frame(fetch('supply'))
+
+
+def fetch_mint_burn_data():
+    """Fetch daily USDM mints and burns; burns are negative"""
+    return mint_burn_frame(fetch('mint'), fetch('burn'))
+
+
+def fetch_trove_data():
+    """Advance the trove ledger; active troves per asset at the end of each day the count changed"""
+    collateral_ledger.update()
+    with transform_timer('troves', 'aggregate'):
+        return collateral_ledger.daily_active()
+
+
+def fetch_moor_staking_data():
+    """Advance the staking ledger; daily MOOR stakes/unstakes with the running total staked"""
+    staking_ledger.update()
+    for field in ('stakes', 'unstakes'):
+        if field in staking_ledger.cursors:
+            cursors[field] = max(cursors.get(field, 0), staking_ledger.cursors[field])
+
+    with transform_timer('moor_staking', 'aggregate'):
+        return staking_ledger.series()
+
+
+def fetch_collateral_data():
+    """Daily collateral, debt, price and TCR per asset; fetch_trove_data advances the ledger"""
+    with transform_timer('collateral', 'aggregate'):
+        return collateral_ledger.series('1D')
+
+
+def fetch_stability_pool_data():
+    """Fetch daily Stability Pool deposits/withdrawals with the running total deposited"""
+    return stability_pool_frame(fetch('stability_pool'))
+
+
+def fetch_redemption_data():
+    """Fetch redemption events aggregated per day and asset"""
+    return redemption_frame(fetch('redemptions'))
+
+
+def fetch_liquidation_data():
+    """Fetch full and partial liquidations aggregated per day, asset and type"""
+    return liquidation_frame(fetch('liquidations'))
+
+
+def _current_and_past(df, column, since, now):
+    """Last value of a running-total column at `now` and before `since` (0 if none yet)"""
+    current_df = df[df['timestamp'] <= now]
+    past_df = current_df[current_df['timestamp'] < since]
+    current = float(current_df.iloc[-1][column]) if not current_df.empty else 0.0
+    past = float(past_df.iloc[-1][column]) if not past_df.empty else 0.0
+    return current, past
+
+
+def compute_kpis(series, ledger, now=None, since=None):
+    """Compute the KPI card values from the snapshot series and the staking ledger, with
+    deltas over (since, now]: by default the last KPI_WINDOW"""
+    now = now or pd.Timestamp.now()
+    since = since if since is not None else now - KPI_WINDOW
+    window = now - since
+
+    current_supply, past_supply = _current_and_past(series['supply'], 'amount', since, now)
+
+    # Sparse per asset: each asset's latest row before a time holds its count then
+    troves = series['troves'][series['troves']['timestamp'] <= now]
+    current_troves = float(troves.groupby('asset')['active_troves'].last().sum())
+    past_troves = float(troves[troves['timestamp'] < since].groupby('asset')['active_troves'].last().sum())
+
+    current_sp, past_sp = _current_and_past(series['stability_pool'], 'total_deposited', since, now)
+    current_moor, past_moor = _current_and_past(series['moor_staking'], 'total_staked', since, now)
+
+    # Liquidated over the window, against the window of the same length before it
+    liquidations = series['liquidations']
+    current_liquidations = liquidations[(liquidations['timestamp'] >= since) &
+                                        (liquidations['timestamp'] <= now)]['debt'].sum()
+    past_liquidations = liquidations[(liquidations['timestamp'] < since) &
+                                     (liquidations['timestamp'] >= since - window)]['debt'].sum()
+
+    # The public fields keep their original meaning: the stakers' share of every mint in the
+    # window, annualized (26 two-week windows a year) against the current stake
+    staking = ledger.window(since.timestamp(), now.timestamp())
+    two_weeks_mints = staking['minted']
+    two_week_distribution = two_weeks_mints * STAKER_MINT_SHARE
+    annual_distribution = two_week_distribution * 26 * (KPI_WINDOW / window)
+    apr = annual_distribution / current_moor * 100 if current_moor > 0 else 0.0
+
+    return {
+        'supply': current_supply,
+        'supply_delta': current_supply - past_supply,
+        'troves': current_troves,
+        'troves_delta': current_troves - past_troves,
+        'sp_deposits': current_sp,
+        'sp_deposits_delta': current_sp - past_sp,
+        'moor_staked': current_moor,
+        'moor_staked_delta': current_moor - past_moor,
+        'liquidations': float(current_liquidations),
+        'liquidations_delta': float(current_liquidations - past_liquidations),
+        'two_week_mints': float(two_weeks_mints),
+        'two_week_distribution': float(two_week_distribution),
+        'moor_apr': float(apr),
+        # From the staking ledger: USDM actually paid out (mints while nothing is staked pay no
+        # one), annualized against the time-weighted stake
+        'staker_rewards': float(staking['rewards']),
+        'realized_apr': float(staking['realized_apr']),
+    }
+
+
+def to_records(df):
+    """Serialize a series DataFrame to JSON-safe records with ISO timestamps"""
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def build_snapshot():
+    """Fetch every dataset once and compute the KPIs and daily series"""
+    series = {
+        'supply': fetch_supply_data(),
+        'mint_burn': fetch_mint_burn_data(),
+        'troves': fetch_trove_data(),
+        'collateral': fetch_collateral_data(),  # after 'troves', which advances the ledger
+        'moor_staking': fetch_moor_staking_data(),
+        'stability_pool': fetch_stability_pool_data(),
+        'redemptions': fetch_redemption_data(),
+        'liquidations': fetch_liquidation_data(),
+    }
+    for df in series.values():
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    with transform_timer('snapshot', 'kpis'):
+        kpis = compute_kpis(series, staking_ledger)
+    with transform_timer('snapshot', 'serialize'):
+        records = {name: to_records(df) for name, df in series.items()}
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'kpis': kpis,
+        'series': records,
+        # DataFrames kept for the binary series formats
+        'frames': series,
+        'cursors': dict(cursors),
+    }
@@ -0,0 +1,174 @@
+"""Stability Pool depositor rewards, by time-weighted compounded deposit.
+
+Deposits shrink pro rata when liquidations are offset against the pool, so
+every depositor's balance is tracked the way the Stability Pool itself does it:
+as a scaled deposit ``compounded / P`` against a running product ``P`` that
+each liquidation multiplies by ``1 - debt / total_deposits``. Between a
+depositor's own events their balance is ``scaled * P(t)``, so their weight over
+the reward window is ``scaled * (I(b) - I(a))`` where ``I`` is the running
+integral of ``P`` over the window. One pass over the time-ordered events
+computes every depositor's weight; each provide/withdraw re-seeds the
+depositor from the event's ``compounded_amount``.
+
+    python sp_rewards_script.py --total-rewards 200000
+
+Writes sp_rewards.csv in the same format as trove_rewards.csv.
+"""
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from gql import gql
+
+import datasets
+from profiling import Profile, should_profile
+from rewards_script import END_DATE, GRAPHQL_URL, PRECISION, START_DATE, rewards_frame
+
+SP_EVENTS_QUERY = """
+query {
+    deposits: StabilityPool_ProvideToStabilityPoolEvent(
+        where: {timestamp: {_lte: %d}}
+        order_by: {timestamp: asc}
+    ) {
+        identity
+        amount
+        compounded_amount
+        timestamp
+    }
+    withdrawals: StabilityPool_WithdrawFromStabilityPoolEvent(
+        where: {timestamp: {_lte: %d}}
+        order_by: {timestamp: asc}
+    ) {
+        identity
+        amount
+        compounded_amount
+        timestamp
+    }
+    liquidations: StabilityPool_StabilityPoolLiquidationEvent(
+        where: {timestamp: {_lte: %d}}
+        order_by: {timestamp: asc}
+    ) {
+        debt_to_offset
+        timestamp
+    }
+}
+"""
+
+# Event kinds, also the apply order for events in the same block
+PROVIDE, WITHDRAW, LIQUIDATION = 0, 1, 2
+
+
+def fetch_sp_events(end=END_DATE):
+    """Fetch all Stability Pool deposits, withdrawals and liquidation offsets up to `end`"""
+    return datasets.execute(gql(SP_EVENTS_QUERY % (end, end, end)), 'sp_rewards_events')
+
+
+def event_columns(result):
+    """Time-ordered event columns: timestamp, kind, depositor code, new deposit, debt offset"""
+    frames = []
+    for field, kind in (('deposits', PROVIDE), ('withdrawals', WITHDRAW)):
+        df = pd.DataFrame(result[field], columns=['identity', 'amount', 'compounded_amount', 'timestamp'])
+        amount = df['amount'].astype(float) / PRECISION
+        compounded = df['compounded_amount'].astype(float) / PRECISION
+        # compounded_amount is the deposit before this event
+        deposit = compounded + amount if kind == PROVIDE else compounded - amount
+        frames.append(pd.DataFrame({
+            'timestamp': df['timestamp'].astype(np.int64), 'kind': kind, 'identity': df['identity'],
+            'deposit': deposit.clip(lower=0), 'debt': 0.0,
+        }))
+    df = pd.DataFrame(result['liquidations'], columns=['debt_to_offset', 'timestamp'])
+    frames.append(pd.DataFrame({
+        'timestamp': df['timestamp'].astype(np.int64), 'kind': LIQUIDATION, 'identity': None,
+        'deposit': 0.0, 'debt': df['debt_to_offset'].astype(float) / PRECISION,
+    }))
+    events = pd.concat(frames, ignore_index=True).sort_values(['timestamp', 'kind'], kind='stable')
+    codes, identities = pd.factorize(events['identity'])
+    return {
+        'timestamp': events['timestamp'].to_numpy(),
+        'kind': events['kind'].to_numpy(),
+        'depositor': codes,
+        'deposit': events['deposit'].to_numpy(),
+        'debt': events['debt'].to_numpy(),
+        'identities': np.asarray(identities),
+    }
+
+
+def depositor_weights(columns, start=START_DATE, end=END_DATE):
+    """Each depositor's compounded deposit integrated over [start, end], in one pass"""
+    n = len(columns['identities'])
+    # Plain lists: the loop touches single elements, where numpy scalars are slow
+    scaled = [0.0] * n          # deposit / P at the depositor's last event
+    since = [0.0] * n           # I at the depositor's last event
+    epoch_of = [0] * n
+    weight = [0.0] * n
+    epoch_end = []              # I when each emptied epoch ended
+    product, integral, total_scaled, epoch = 1.0, 0.0, 0.0, 0
+    window_start, window_end = int(start), int(end)
+    previous = window_start
+
+    for timestamp, kind, depositor, deposit, debt in zip(
+            columns['timestamp'].tolist(), columns['kind'].tolist(), columns['depositor'].tolist(),
+            columns['deposit'].tolist(), columns['debt'].tolist()):
+        clamped = min(max(timestamp, window_start), window_end)
+        integral += product * (clamped - previous)
+        previous = clamped
+
+        if kind == LIQUIDATION:
+            total = total_scaled * product
+            if total <= 0:
+                continue
+            if debt >= total:
+                # Pool emptied: every deposit is wiped and a new epoch starts at P = 1
+                epoch_end.append(integral)
+                product, total_scaled, epoch = 1.0, 0.0, epoch + 1
+            else:
+                product -= debt / total_scaled
+            continue
+
+        if epoch_of[depositor] == epoch:
+            weight[depositor] += scaled[depositor] * (integral - since[depositor])
+            total_scaled -= scaled[depositor]
+        else:
+            weight[depositor] += scaled[depositor] * (epoch_end[epoch_of[depositor]] - since[depositor])
+        scaled[depositor] = deposit / product
+        total_scaled += scaled[depositor]
+        since[depositor] = integral
+        epoch_of[depositor] = epoch
+
+    integral += product * (window_end - previous)
+    epoch_end.append(integral)
+    for depositor in range(n):
+        weight[depositor] += scaled[depositor] * (epoch_end[epoch_of[depositor]] - since[depositor])
+    return pd.Series(weight, index=columns['identities'])
+
+
+def calculate_sp_rewards(total_rewards, start=START_DATE, end=END_DATE):
+    """Split `total_rewards` pro rata to each depositor's time-weighted deposit"""
+    weights = depositor_weights(event_columns(fetch_sp_events(end)), start, end)
+    weights = weights[weights > 0]
+    return (weights / weights.sum() * total_rewards).to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stability Pool depositor rewards")
+    parser.add_argument('--total-rewards', type=float, required=True)
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Window start (default: the trove campaign's)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Window end (default: the trove campaign's)")
+    parser.add_argument('--output', default='sp_rewards.csv')
+    args = parser.parse_args()
+    start = args.start.timestamp() if args.start else START_DATE
+    end = args.end.timestamp() if args.end else END_DATE
+
+    rewards_df = rewards_frame(calculate_sp_rewards(args.total_rewards, start, end))
+    rewards_df.to_csv(args.output, index=False, float_format='%.9f')  # Format with 9 decimal places
+    print(f"Rewards calculated and saved to {args.output}")
+    print(f"Total rewards distributed: {rewards_df['amount'].sum():,.9f}")
+
+
+if __name__ == "__main__":
+    datasets.configure(GRAPHQL_URL)
+    with Profile('sp_rewards', should_profile()) as profile:
+        main()
+    if profile.path:
+        print(f"Profile written to {profile.path}")
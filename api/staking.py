@@ -0,0 +1,205 @@
+"""Per-staker MOOR staking ledger with cumulative indexes.
+
+Stakes and unstakes are applied once, in timestamp order, as they arrive past
+the per-field cursors. For the pool and for every staker the ledger keeps, at
+each of their events, the balance after it and the running stake-seconds up to
+it. Each USDM mint pays its staker share pro rata to the stake at that moment,
+which the ledger records as a running reward per staked MOOR; every staker's
+accrued rewards are kept against it the same way. The time-weighted stake,
+distribution and realized APR over any window are then a binary search per
+window end.
+"""
+import bisect
+import threading
+from datetime import datetime
+
+import pandas as pd
+from gql import gql
+
+import datasets
+from datasets import PRECISION
+from queries import STAKING_LEDGER_QUERY
+
+# Share of every USDM mint distributed to MOOR stakers
+STAKER_MINT_SHARE = 1 / 200
+YEAR_SECONDS = 365 * 24 * 60 * 60
+LEDGER_FIELDS = ['mints', 'stakes', 'unstakes']
+
+staking_ledger_query = gql(STAKING_LEDGER_QUERY)
+
+
+class Timeline:
+    """A step function of time with its running integral, one entry per change"""
+
+    def __init__(self):
+        self.times = []
+        self.values = []      # value from times[i] until the next change
+        self.integrals = []   # integral of the value up to times[i]
+
+    @classmethod
+    def from_state(cls, state):
+        timeline = cls()
+        timeline.times, timeline.values, timeline.integrals = state
+        return timeline
+
+    def state(self):
+        """JSON-serializable contents, for from_state"""
+        return [self.times, self.values, self.integrals]
+
+    def last(self):
+        return self.values[-1] if self.values else 0.0
+
+    def set(self, timestamp, value):
+        """Change the value at `timestamp`; timestamps must not decrease"""
+        if self.times and timestamp == self.times[-1]:
+            self.values[-1] = value
+            return
+        integral = self.integral(timestamp) if self.times else 0.0
+        self.times.append(timestamp)
+        self.values.append(value)
+        self.integrals.append(integral)
+
+    def index(self, timestamp):
+        """Position of the last change at or before `timestamp`, or -1"""
+        return bisect.bisect_right(self.times, timestamp) - 1
+
+    def value(self, timestamp):
+        i = self.index(timestamp)
+        return self.values[i] if i >= 0 else 0.0
+
+    def integral(self, timestamp):
+        i = self.index(timestamp)
+        return self.integrals[i] + self.values[i] * (timestamp - self.times[i]) if i >= 0 else 0.0
+
+
+class Stake(Timeline):
+    """One staker's balance, also accruing rewards against the reward-per-stake index"""
+
+    def __init__(self):
+        super().__init__()
+        self.reward_indexes = []  # reward per staked MOOR at times[i]
+        self.rewards = []         # rewards accrued up to times[i]
+
+    def set(self, timestamp, value, reward_index=0.0):
+        accrued = self.rewards[-1] + self.values[-1] * (reward_index - self.reward_indexes[-1]) if self.times else 0.0
+        if self.times and timestamp == self.times[-1]:
+            self.rewards[-1], self.reward_indexes[-1] = accrued, reward_index
+        else:
+            self.rewards.append(accrued)
+            self.reward_indexes.append(reward_index)
+        super().set(timestamp, value)
+
+    def accrued(self, timestamp, reward_index):
+        """Rewards up to `timestamp`, given the reward-per-stake index at that time"""
+        i = self.index(timestamp)
+        return self.rewards[i] + self.values[i] * (reward_index - self.reward_indexes[i]) if i >= 0 else 0.0
+
+
+class StakingLedger:
+    """Pool and per-staker MOOR stake, advanced by the events past the cursors"""
+
+    def __init__(self):
+        self.cursors = {}
+        self.total = Timeline()
+        self.stakers = {}
+        # Running totals of USDM minted, paid to stakers, and paid per staked MOOR
+        self.minted = Timeline()
+        self.distributed = Timeline()
+        self.reward_per_stake = Timeline()
+        # (timestamp, field, amount) of every stake and unstake, for the daily series
+        self.events = []
+        self.updated_at = None
+        self.lock = threading.Lock()
+
+    def update(self):
+        """Fetch and apply the events past the cursors; return the fetched result"""
+        variables = {field: self.cursors.get(field, 0) for field in LEDGER_FIELDS}
+        result = datasets.execute_settled(staking_ledger_query, 'staking_ledger', variables)
+        with self.lock:
+            self.apply(result)
+            self.updated_at = datetime.now().isoformat()
+        return result
+
+    def apply(self, result):
+        # Fees minted in the same block are paid to the stake before that block's stakes and unstakes
+        events = sorted(
+            ((int(row['timestamp']), LEDGER_FIELDS.index(field), field, row)
+             for field, rows in result.items() for row in rows),
+            key=lambda event: event[:2],
+        )
+        for timestamp, _, field, row in events:
+            amount = float(row['amount']) / PRECISION
+            if field == 'mints':
+                self.apply_mint(timestamp, amount)
+                continue
+            self.events.append((timestamp, field, amount))
+            stake = self.stakers.get(row['identity'])
+            if stake is None:
+                stake = self.stakers[row['identity']] = Stake()
+            balance = stake.last()
+            new_balance = max(balance + amount if field == 'stakes' else balance - amount, 0.0)
+            stake.set(timestamp, new_balance, self.reward_per_stake.last())
+            self.total.set(timestamp, self.total.last() + new_balance - balance)
+        for field, rows in result.items():
+            if rows:
+                self.cursors[field] = int(rows[-1]['timestamp'])
+        return len(events)
+
+    def apply_mint(self, timestamp, amount):
+        self.minted.set(timestamp, self.minted.last() + amount)
+        staked = self.total.last()
+        # Nothing is paid out while nothing is staked
+        if staked > 0:
+            fee = amount * STAKER_MINT_SHARE
+            self.distributed.set(timestamp, self.distributed.last() + fee)
+            self.reward_per_stake.set(timestamp, self.reward_per_stake.last() + fee / staked)
+
+    def window(self, start, end, identity=None):
+        """Time-weighted stake, distribution and realized APR over (start, end], for the pool or one staker"""
+        with self.lock:
+            timeline = self.total if identity is None else self.stakers.get(identity)
+            if timeline is None:
+                return None
+            stake_seconds = timeline.integral(end) - timeline.integral(start)
+            minted = self.minted.value(end) - self.minted.value(start)
+            # The pool's rewards are exact per mint; a staker's follow the reward-per-stake index
+            if identity is None:
+                rewards = self.distributed.value(end) - self.distributed.value(start)
+            else:
+                rewards = (timeline.accrued(end, self.reward_per_stake.value(end))
+                           - timeline.accrued(start, self.reward_per_stake.value(start)))
+            staked = timeline.value(end)
+        duration = end - start
+        window = {
+            'start': start,
+            'end': end,
+            'staked': staked,
+            'average_staked': stake_seconds / duration if duration > 0 else staked,
+            'stake_seconds': stake_seconds,
+            'rewards': rewards,
+            'realized_apr': rewards * YEAR_SECONDS / stake_seconds * 100 if stake_seconds > 0 else 0.0,
+        }
+        if identity is None:
+            window['minted'] = minted
+        return window
+
+    def series(self, freq='1D', start=None, end=None):
+        """MOOR stakes and unstakes (negative) per `freq` bucket with the running total staked,
+        from the bucket holding `start` through `end` (default: every bucket)"""
+        with self.lock:
+            events = list(self.events)
+        if not events:
+            return pd.DataFrame(columns=['timestamp', 'amount', 'type', 'total_staked'])
+        df = pd.DataFrame(events, columns=['timestamp', 'field', 'amount'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        buckets = df.groupby([df['timestamp'].dt.floor(freq), 'field'])['amount'].sum().reset_index()
+        buckets['type'] = buckets['field'].map({'stakes': 'Stake', 'unstakes': 'Unstake'})
+        buckets.loc[buckets['field'] == 'unstakes', 'amount'] *= -1
+        buckets = buckets.drop(columns='field').sort_values(['timestamp', 'type'], ignore_index=True)
+        # The running total counts every earlier bucket, in range or not
+        buckets['total_staked'] = buckets['amount'].cumsum()
+        if start is not None:
+            buckets = buckets[buckets['timestamp'] >= pd.Timestamp(start).floor(freq)]
+        if end is not None:
+            buckets = buckets[buckets['timestamp'] <= pd.Timestamp(end)]
+        return buckets.reset_index(drop=True)
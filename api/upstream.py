@@ -0,0 +1,115 @@
+"""Bounded, fail-fast access to the GraphQL upstream.
+
+Every client gets a per-request timeout. Reads that fail transiently (timeout,
+connection error, 429/5xx) are retried with jittered exponential backoff, and a
+circuit breaker shared by all clients of the upstream opens after repeated
+failures so callers fail immediately instead of queueing behind a struggling
+indexer. Callers keep serving their last good data while it is open.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from gql import Client
+from gql.transport.exceptions import TransportServerError
+from gql.transport.requests import RequestsHTTPTransport
+
+import instrumentation
+
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 30))
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+UPSTREAM_BACKOFF = 0.5
+UPSTREAM_BACKOFF_MAX = 8
+# Consecutive failed queries before the breaker opens, and how long it stays open
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 30))
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the upstream while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed until `failures` consecutive failures, then open for `reset_seconds`,
+    then half-open: one trial call decides whether it closes or opens again"""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state('half_open')
+                return
+            if self.state != 'closed':
+                # Open, or half-open with the trial call already in flight
+                raise UpstreamUnavailable(f"Upstream circuit breaker is {self.state}")
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self._set_state('closed')
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failures:
+                self.opened_at = time.monotonic()
+                self._set_state('open')
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning("Upstream circuit breaker %s -> %s", self.state, state)
+        self.state = state
+        instrumentation.BREAKER_STATE.set(('closed', 'half_open', 'open').index(state))
+
+
+breaker = CircuitBreaker()
+
+
+def make_client(url):
+    """A sync gql client for the upstream with a bounded request timeout"""
+    transport = RequestsHTTPTransport(url=url, timeout=UPSTREAM_TIMEOUT)
+    return Client(transport=transport, fetch_schema_from_transport=False)
+
+
+def is_transient(error):
+    """Worth retrying: timeouts, dropped connections and overloaded-server responses"""
+    # gql 4 wraps the requests exception, gql 3 raises it as is
+    for candidate in (error, error.__cause__):
+        if isinstance(candidate, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+    if isinstance(error, TransportServerError):
+        return error.code is None or error.code == 429 or error.code >= 500
+    return False
+
+
+def execute(client, document, query_name, variables=None):
+    """Run a read query through the breaker, retrying transient failures with full jitter"""
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        breaker.before_call()
+        try:
+            result = instrumentation.execute(client, document, query_name, variables)
+        except Exception as error:
+            if not is_transient(error):
+                # The upstream answered; the query itself is at fault
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            instrumentation.UPSTREAM_RETRIES.labels(query_name).inc()
+            time.sleep(random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF * 2 ** attempt)))
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,235 @@
+"""Per-wallet index of trove, Stability Pool and staking state.
+
+Every identity-bearing event is applied once, in timestamp order, to the state
+of the wallet it belongs to; later updates only fetch events newer than the
+per-field cursors. A lookup is then a dict access plus serializing that
+wallet's own history.
+
+The index also tracks each wallet's time-weighted collateral for the reward
+campaign configured in rewards_script.py, and campaign-wide totals kept as
+``weight + collateral * t - offset`` so any wallet's estimated share can be
+computed at any time without touching the other wallets.
+
+Set WALLET_INDEX_PATH to persist the index between restarts.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from gql import gql
+
+import datasets
+from collateral import TROVE_EVENT_ORDER, trove_change
+from datasets import PRECISION
+from queries import WALLET_EVENTS_QUERY
+from rewards_script import ASSET_SHARES, START_DATE, END_DATE, TOTAL_REWARDS
+
+WALLET_INDEX_PATH = os.getenv('WALLET_INDEX_PATH')
+
+# Events in the same block are applied opens first, closes last
+EVENT_ORDER = TROVE_EVENT_ORDER + ['deposits', 'withdrawals', 'stakes', 'unstakes']
+HISTORY_EVENTS = {
+    'opens': 'open', 'adjusts': 'adjust', 'partial_liquidations': 'partial_liquidation',
+    'redemptions': 'redemption', 'closes': 'close', 'liquidations': 'liquidation',
+}
+
+wallet_events_query = gql(WALLET_EVENTS_QUERY)
+
+
+def _elapsed(timestamp):
+    """Seconds of the campaign window before `timestamp`, clamped to the window"""
+    return min(max(timestamp, START_DATE), END_DATE) - START_DATE
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _amount(row, field):
+    return float(row[field]) / PRECISION
+
+
+def new_wallet():
+    return {
+        'troves': {},
+        'collateral_history': {},
+        'stability_pool': {'deposit': 0.0, 'updated_at': None},
+        'staking': {'staked': 0.0, 'updated_at': None},
+    }
+
+
+class WalletIndex:
+    """Wallet states keyed by identity, advanced by the events past the cursors"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.wallets = state.get('wallets', {})
+        self.cursors = state.get('cursors', {})
+        # Per campaign asset; see the module docstring
+        self.campaign = state.get('campaign') or {
+            asset: {'weight': 0.0, 'collateral': 0.0, 'offset': 0.0} for asset in ASSET_SHARES
+        }
+        self.updated_at = state.get('updated_at')
+        self.lock = threading.Lock()
+
+    def update(self):
+        """Fetch and apply the events past the cursors; return how many were applied"""
+        variables = {field: self.cursors.get(field, 0) for field in EVENT_ORDER}
+        result = datasets.execute_settled(wallet_events_query, 'wallet_events', variables)
+        with self.lock:
+            applied = self.apply(result)
+            self.updated_at = datetime.now().isoformat()
+        if applied and WALLET_INDEX_PATH:
+            self.save(WALLET_INDEX_PATH)
+        return applied
+
+    def apply(self, result):
+        events = sorted(
+            ((int(row['timestamp']), EVENT_ORDER.index(field), field, row)
+             for field, rows in result.items() for row in rows),
+            key=lambda event: event[:2],
+        )
+        for timestamp, _, field, row in events:
+            wallet = self.wallets.get(row['identity'])
+            if wallet is None:
+                wallet = self.wallets[row['identity']] = new_wallet()
+            if field in HISTORY_EVENTS:
+                self.apply_trove_event(wallet, field, row, timestamp)
+            elif field in ('deposits', 'withdrawals'):
+                # compounded_amount is the deposit, after liquidation losses, before this event
+                change = _amount(row, 'amount') if field == 'deposits' else -_amount(row, 'amount')
+                wallet['stability_pool'] = {
+                    'deposit': max(_amount(row, 'compounded_amount') + change, 0.0), 'updated_at': timestamp}
+            else:
+                staked = wallet['staking']['staked']
+                staked += _amount(row, 'amount') if field == 'stakes' else -_amount(row, 'amount')
+                wallet['staking'] = {'staked': max(staked, 0.0), 'updated_at': timestamp}
+        for field, rows in result.items():
+            if rows:
+                self.cursors[field] = int(rows[-1]['timestamp'])
+        return len(events)
+
+    def apply_trove_event(self, wallet, field, row, timestamp):
+        asset = row['asset']
+        trove = wallet['troves'].get(asset)
+        if field == 'opens':
+            if trove is None:
+                trove = wallet['troves'][asset] = {
+                    'status': 'open', 'collateral': 0.0, 'debt': 0.0, 'weight': 0.0, 'since': timestamp}
+            trove.update(status='open', opened_at=timestamp)
+        elif trove is None or trove['status'] != 'open':
+            # Events for a trove opened before the indexed history began
+            return
+
+        collateral, debt = trove_change(field, row, trove['collateral'], trove['debt'])
+        if field == 'redemptions' and collateral <= 0:
+            trove['status'] = 'redeemed'
+        elif field in ('closes', 'liquidations'):
+            trove['status'] = 'closed' if field == 'closes' else 'liquidated'
+        self.set_collateral(asset, trove, collateral, timestamp)
+        trove['debt'] = debt
+        trove['updated_at'] = timestamp
+        wallet['collateral_history'].setdefault(asset, []).append(
+            [timestamp, trove['collateral'], trove['debt'], HISTORY_EVENTS[field]])
+
+    def set_collateral(self, asset, trove, collateral, timestamp):
+        """Accrue the trove's campaign weight up to `timestamp`, then change its collateral"""
+        totals = self.campaign.get(asset)
+        if totals is not None:
+            now, since = _elapsed(timestamp), _elapsed(trove['since'])
+            accrued = trove['collateral'] * (now - since)
+            trove['weight'] += accrued
+            totals['weight'] += accrued
+            totals['collateral'] += collateral - trove['collateral']
+            totals['offset'] += collateral * now - trove['collateral'] * since
+        trove['collateral'] = collateral
+        trove['since'] = timestamp
+
+    def estimated_rewards(self, wallet, timestamp):
+        """Each campaign asset's reward if shares stay as they are at `timestamp`"""
+        now = _elapsed(timestamp)
+        rewards = {}
+        for asset, share in ASSET_SHARES.items():
+            trove = wallet['troves'].get(asset)
+            totals = self.campaign[asset]
+            total_weight = totals['weight'] + totals['collateral'] * now - totals['offset']
+            if trove is None or total_weight <= 0:
+                continue
+            weight = trove['weight'] + trove['collateral'] * (now - _elapsed(trove['since']))
+            rewards[asset] = weight / total_weight * TOTAL_REWARDS * share
+        return rewards
+
+    def lookup(self, identity, timestamp=None):
+        """The wallet's current state, collateral history and estimated rewards, or None"""
+        timestamp = timestamp or datetime.now().timestamp()
+        with self.lock:
+            wallet = self.wallets.get(identity)
+            if wallet is None:
+                return None
+            rewards = self.estimated_rewards(wallet, timestamp)
+            return {
+                'identity': identity,
+                'updated_at': self.updated_at,
+                'troves': {
+                    asset: {
+                        'status': trove['status'],
+                        'collateral': trove['collateral'],
+                        'debt': trove['debt'],
+                        'opened_at': _iso(trove['opened_at']),
+                        'updated_at': _iso(trove['updated_at']),
+                    }
+                    for asset, trove in wallet['troves'].items()
+                },
+                'collateral_history': {
+                    asset: [
+                        {'timestamp': _iso(ts), 'collateral': collateral, 'debt': debt, 'event': event}
+                        for ts, collateral, debt, event in history
+                    ]
+                    for asset, history in wallet['collateral_history'].items()
+                },
+                'stability_pool': {
+                    'deposit': wallet['stability_pool']['deposit'],
+                    'updated_at': wallet['stability_pool']['updated_at'] and _iso(wallet['stability_pool']['updated_at']),
+                },
+                'staking': {
+                    'staked': wallet['staking']['staked'],
+                    'updated_at': wallet['staking']['updated_at'] and _iso(wallet['staking']['updated_at']),
+                },
+                'rewards': {
+                    'campaign': {
+                        'start': _iso(START_DATE),
+                        'end': _iso(END_DATE),
+                        'total_rewards': TOTAL_REWARDS,
+                        'active': START_DATE <= timestamp < END_DATE,
+                    },
+                    'estimated': rewards,
+                    'total': sum(rewards.values()),
+                },
+            }
+
+    def save(self, path):
+        """Write the index atomically so a restart resumes from the cursors"""
+        with self.lock:
+            payload = json.dumps({
+                'wallets': self.wallets,
+                'cursors': self.cursors,
+                'campaign': self.campaign,
+                'campaign_window': [START_DATE, END_DATE],
+                'updated_at': self.updated_at,
+            })
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+def load_index():
+    """The persisted index from WALLET_INDEX_PATH if there is one, else an empty index"""
+    if WALLET_INDEX_PATH and os.path.exists(WALLET_INDEX_PATH):
+        with open(WALLET_INDEX_PATH) as f:
+            state = json.load(f)
+        # Campaign weights accrued for another window are useless; rebuild from scratch
+        if state.get('campaign_window') == [START_DATE, END_DATE]:
+            return WalletIndex(state)
+    return WalletIndex()
@@ -1,271 +1,204 @@
 import streamlit as st
 import pandas as pd
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-import plotly.express as px
-from queries import (
-    TOTAL_SUPPLY_QUERY,
-    MINT_BURN_QUERIES,
-    TROVE_EVENTS_QUERY,
-    MOOR_STAKING_QUERY,
-    STABILITY_POOL_QUERY,
-    REDEMPTION_QUERY,
-    LIQUIDATION_QUERY,
-)
+import requests
 import os
+import charts
+from charts import RANGES, RESOLUTIONS
+from instrumentation import RunTimings, logger, start_metrics_server
+from profiling import Profile, should_profile
 
 # Constants
-PRECISION = 1e9
-GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'http://localhost:8080/v1/graphql')
-
-# Set up the GraphQL client
-transport = RequestsHTTPTransport(url=GRAPHQL_URL)
-client = Client(transport=transport, fetch_schema_from_transport=False)
-
-# Convert the query strings to gql objects
-query = gql(TOTAL_SUPPLY_QUERY)
-mint_query = gql(MINT_BURN_QUERIES["mint"])
-burn_query = gql(MINT_BURN_QUERIES["burn"])
-trove_events_query = gql(TROVE_EVENTS_QUERY)
-moor_staking_query = gql(MOOR_STAKING_QUERY)
-stability_pool_query = gql(STABILITY_POOL_QUERY)
-redemption_query = gql(REDEMPTION_QUERY)
-liquidation_query = gql(LIQUIDATION_QUERY)
-
-def process_df(df):
-    """Helper function to process dataframes"""
-    # Check if DataFrame is empty or missing required columns
-    if df.empty or 'timestamp' not in df.columns or 'amount' not in df.columns:
-        return pd.DataFrame(columns=['timestamp', 'amount'])
-    
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    df['amount'] = df['amount'].astype(float) / PRECISION
-    return df
-
-def fetch_and_process_data():
-    # Execute the query
-    result = client.execute(query)
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(result['USDM_TotalSupplyEvent'])
-    
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    
-    # Convert amount from wei to USDM (assuming 18 decimals)
-    df['amount'] = df['amount'].astype(float) / PRECISION
-    
-    # Filter out rows with large jumps
-    threshold = 200_000 
-    df['amount_diff'] = df['amount'].diff().abs()
-    df = df[df['amount_diff'].fillna(0) < threshold]
-    df = df.drop('amount_diff', axis=1)
-    
-    return df
-
-def fetch_mint_burn_data():
-    # Execute the queries
-    mint_result = client.execute(mint_query)
-    burn_result = client.execute(burn_query)
-    
-    # Convert to DataFrames
-    mint_df = process_df(pd.DataFrame(mint_result['USDM_Mint']))
-    burn_df = process_df(pd.DataFrame(burn_result['USDM_Burn']))
-    
-    # Handle empty DataFrames
-    if mint_df.empty and burn_df.empty:
-        empty_df = pd.DataFrame(columns=['timestamp', 'amount'])
-        return empty_df, empty_df
-    
-    # Group by day and sum the amounts (only if not empty)
-    if not mint_df.empty:
-        mint_df = mint_df.groupby(mint_df['timestamp'].dt.date)['amount'].sum().reset_index()
-        mint_df['timestamp'] = pd.to_datetime(mint_df['timestamp'])
-    
-    if not burn_df.empty:
-        burn_df = burn_df.groupby(burn_df['timestamp'].dt.date)['amount'].sum().reset_index()
-        burn_df['timestamp'] = pd.to_datetime(burn_df['timestamp'])
-    
-    return mint_df, burn_df
-
-def fetch_trove_data():
-    """Fetch and process trove-related events"""
-    result = client.execute(trove_events_query)
-    
-    # Convert each event type to DataFrame
-    opens_df = pd.DataFrame(result['open'])
-    closes_df = pd.DataFrame(result['close'])
-    liquidations_df = pd.DataFrame(result['liquidation_full'])
-    
-    # Check if all DataFrames are empty
-    if opens_df.empty and closes_df.empty and liquidations_df.empty:
-        return pd.DataFrame(columns=['asset', 'timestamp', 'event', 'active_troves'])
-    
-    # Add event type column to each DataFrame
-    opens_df['event'] = 1  # +1 for opens
-    closes_df['event'] = -1  # -1 for closes
-    liquidations_df['event'] = -1  # -1 for liquidations
-    
-    # Combine all events
-    all_events = pd.concat([opens_df, closes_df, liquidations_df])
-    all_events['timestamp'] = pd.to_datetime(all_events['timestamp'], unit='s')
-    
-    # Group by asset and date, calculate running total of troves
-    all_events = all_events.sort_values('timestamp')
-    grouped = all_events.groupby(['asset', all_events['timestamp'].dt.date])['event'].sum().reset_index()
-    
-    # Convert the date column back to datetime for proper handling
-    grouped['timestamp'] = pd.to_datetime(grouped['timestamp'])
-    
-    # Create a complete date range
-    date_range = pd.date_range(start=grouped['timestamp'].min(), 
-                              end=grouped['timestamp'].max(), 
-                              freq='D')
-    
-    # Create a MultiIndex with all asset-date combinations
-    assets = grouped['asset'].unique()
-    multi_index = pd.MultiIndex.from_product([assets, date_range], 
-                                           names=['asset', 'timestamp'])
-    
-    # Reindex and forward fill
-    grouped = (grouped.set_index(['asset', 'timestamp'])
-                     .reindex(multi_index)
-                     .fillna(0))  # Fill missing dates with 0 events
-    
-    # Reset index and calculate cumulative sum
-    grouped = grouped.reset_index()
-    grouped['active_troves'] = grouped.groupby('asset')['event'].cumsum()
-    
-    return grouped
-
-def fetch_moor_staking_data():
-    """Fetch and process MOOR staking events"""
-    result = client.execute(moor_staking_query)
-    
-    # Convert to DataFrames and process
-    stakes_df = process_df(pd.DataFrame(result['stakes']))
-    unstakes_df = process_df(pd.DataFrame(result['unstakes']))
-    
-    # Group by day and sum the amounts
-    stakes_df = stakes_df.groupby(stakes_df['timestamp'].dt.date)['amount'].sum().reset_index()
-    unstakes_df = unstakes_df.groupby(unstakes_df['timestamp'].dt.date)['amount'].sum().reset_index()
-    
-    # Label the events
-    stakes_df['type'] = 'Stake'
-    unstakes_df['type'] = 'Unstake'
-    unstakes_df['amount'] = -unstakes_df['amount']  # Make unstakes negative
-    
-    # Combine stake and unstake data
-    combined_df = pd.concat([stakes_df, unstakes_df])
-    
-    # Calculate running total of staked MOOR
-    combined_df = combined_df.sort_values('timestamp')
-    combined_df['total_staked'] = combined_df['amount'].cumsum()
-    
-    return combined_df
-
-def fetch_stability_pool_data():
-    """Fetch and process Stability Pool deposit/withdrawal events"""
-    result = client.execute(stability_pool_query)
-    
-    # Convert to DataFrames and process
-    deposits_df = process_df(pd.DataFrame(result['deposits']))
-    withdrawals_df = process_df(pd.DataFrame(result['withdrawals']))
-    
-    # Handle empty DataFrames
-    if deposits_df.empty and withdrawals_df.empty:
-        return pd.DataFrame(columns=['timestamp', 'amount', 'type', 'total_deposited'])
-    
-    # Group by day and sum the amounts (only if not empty)
-    if not deposits_df.empty:
-        deposits_df = deposits_df.groupby(deposits_df['timestamp'].dt.date)['amount'].sum().reset_index()
-        deposits_df['timestamp'] = pd.to_datetime(deposits_df['timestamp'])
-    
-    if not withdrawals_df.empty:
-        withdrawals_df = withdrawals_df.groupby(withdrawals_df['timestamp'].dt.date)['amount'].sum().reset_index()
-        withdrawals_df['timestamp'] = pd.to_datetime(withdrawals_df['timestamp'])
-    
-    # Label the events
-    deposits_df['type'] = 'Deposit'
-    withdrawals_df['type'] = 'Withdrawal'
-    withdrawals_df['amount'] = -withdrawals_df['amount']  # Make withdrawals negative
-    
-    # Combine deposit and withdrawal data
-    combined_df = pd.concat([deposits_df, withdrawals_df])
-    
-    # Calculate running total of deposits in Stability Pool
-    combined_df = combined_df.sort_values('timestamp')
-    combined_df['total_deposited'] = combined_df['amount'].cumsum()
-    
-    return combined_df
-
-def fetch_redemption_data():
-    """Fetch and process redemption events"""
-    result = client.execute(redemption_query)
-    df = pd.DataFrame(result['TroveManager_RedemptionEvent'])
-    
-    # Check if dataframe is empty
-    if df.empty:
-        return pd.DataFrame(columns=['timestamp', 'asset', 'usdm_amount', 
-                                   'collateral_amount', 'collateral_price'])
-    
-    # Process data only if df is not empty
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    df['usdm_amount'] = df['usdm_amount'].astype(float) / PRECISION
-    df['collateral_amount'] = df['collateral_amount'].astype(float) / PRECISION
-    df['collateral_price'] = df['collateral_price'].astype(float) / PRECISION
-    return df
-
-def fetch_liquidation_data():
-    """Fetch and process liquidation events"""
-    result = client.execute(liquidation_query)
-    
-    # Process full liquidations
-    full_df = pd.DataFrame(result['full'])
-    if not full_df.empty:
-        full_df['timestamp'] = pd.to_datetime(full_df['timestamp'], unit='s')
-        full_df['debt'] = full_df['debt'].astype(float) / PRECISION
-        full_df['collateral'] = full_df['collateral'].astype(float) / PRECISION
-        full_df['type'] = 'Full'
-
-    # Process partial liquidations
-    partial_df = pd.DataFrame(result['partial'])
-    if not partial_df.empty:
-        partial_df['timestamp'] = pd.to_datetime(partial_df['timestamp'], unit='s')
-        partial_df['debt'] = partial_df['remaining_debt'].astype(float) / PRECISION
-        partial_df['collateral'] = partial_df['remaining_collateral'].astype(float) / PRECISION
-        partial_df['type'] = 'Partial'
-        partial_df = partial_df.drop(['remaining_debt', 'remaining_collateral'], axis=1)
-
-    # Combine the dataframes
-    liquidation_df = pd.concat([full_df, partial_df]) if not (full_df.empty and partial_df.empty) else pd.DataFrame()
-    
-    if not liquidation_df.empty:
-        # Group by day and asset
-        daily_liquidations = liquidation_df.groupby(
-            [liquidation_df['timestamp'].dt.date, 'asset', 'type']
-        ).agg({
-            'debt': 'sum',
-            'collateral': 'sum'
-        }).reset_index()
-        
-        # Convert the date column back to datetime for proper handling
-        daily_liquidations['timestamp'] = pd.to_datetime(daily_liquidations['timestamp'])
-        
-        return daily_liquidations
-    
-    return pd.DataFrame(columns=['timestamp', 'asset', 'type', 'debt', 'collateral'])
-
-def format_number(num):
-    """Format numbers to human readable format with K and M suffixes"""
-    if abs(num) >= 1_000_000:
-        return f"{num/1_000_000:.3f}M"
-    elif abs(num) >= 1_000:
-        return f"{num/1_000:.1f}K"
+API_URL = os.getenv('API_URL', 'http://localhost:8000')
+API_TIMEOUT = 30
+# The API refreshes its snapshot every few minutes; re-reading it more often is wasted work
+SNAPSHOT_CACHE_TTL = 60
+
+# Timings for this script run, logged as one JSON line at the end
+run = RunTimings()
+
+@st.cache_resource
+def init_metrics_server():
+    start_metrics_server()
+
+@st.cache_resource
+def last_good_responses():
+    """Last successful API response per endpoint, shared by all sessions"""
+    return {}
+
+def get_json(endpoint):
+    last_good = last_good_responses()
+    try:
+        response = requests.get(f"{API_URL}{endpoint}", timeout=API_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if endpoint not in last_good:
+            raise
+        # Keep showing the last good data, marked stale, while the API is unavailable
+        logger.warning(f"API request for {endpoint} failed ({e}); serving the last good response")
+        return dict(last_good[endpoint], stale=True)
+    run.response_read(endpoint.split('?')[0], len(response.content))
+    last_good[endpoint] = response.json()
+    return last_good[endpoint]
+
+@st.cache_data(ttl=SNAPSHOT_CACHE_TTL)
+def _fetch_snapshot():
+    run.cache_miss('fetch_snapshot')
+    return get_json("/snapshot")
+
+@st.cache_data(ttl=SNAPSHOT_CACHE_TTL)
+def _fetch_kpis(start, end):
+    run.cache_miss('fetch_kpis')
+    return get_json(charts.kpis_endpoint({'start': start, 'end': end}))
+
+@st.cache_data(ttl=SNAPSHOT_CACHE_TTL)
+def _fetch_series(name, start=None, end=None, resolution=None, points=None, y=None):
+    run.cache_miss('fetch_series')
+    payload = get_json(charts.series_endpoint(name, start, end, resolution, points, y))
+    with run.stage(f"decode:{name}"):
+        return charts.decode_series(payload)
+
+def fetch_snapshot():
+    """Fetch the precomputed KPI values from the API"""
+    with run.stage("fetch:snapshot"):
+        return run.cached_call('fetch_snapshot', _fetch_snapshot)
+
+def fetch_kpis(window):
+    """Fetch the KPI values with deltas over the chart range from the API"""
+    with run.stage("fetch:kpis"):
+        return run.cached_call('fetch_kpis', _fetch_kpis, window['start'], window['end'])
+
+def fetch_series(name, window, points=None, y=None):
+    """Fetch one series over the chart range from the API as a DataFrame, downsampled by
+    the API to `points` per line (by column `y`, default the series' plotted value)"""
+    with run.stage(f"fetch:{name}"):
+        return run.cached_call('fetch_series', _fetch_series, name, window['start'], window['end'],
+                               window['resolution'], points, y)
+
+@st.cache_data(ttl=SNAPSHOT_CACHE_TTL)
+def _fetch_staking(start, end):
+    run.cache_miss('fetch_staking')
+    return get_json(f"/staking?start={start}&end={end}")
+
+def fetch_staking(start, end):
+    """Fetch the time-weighted stake and realized APR for a window from the API"""
+    with run.stage("fetch:staking"):
+        return run.cached_call('fetch_staking', _fetch_staking, start, end)
+
+def plot_chart(fig):
+    with run.stage("render"):
+        st.plotly_chart(fig)
+
+def plot_charts(figures, empty_message=None):
+    """Render a section's (subheader, figure) pairs from charts.py"""
+    if not figures and empty_message:
+        st.info(empty_message)
+    for subheader, fig in figures:
+        if subheader:
+            st.subheader(subheader)
+        plot_chart(fig)
+
+def metric_cards(cards):
+    """Render (title, value, delta) cards from charts.py side by side"""
+    for column, (title, value, delta) in zip(st.columns(len(cards)), cards):
+        with column:
+            st.metric(title, value, delta)
+
+def section_fetch(window):
+    """fetch(name, points=None, y=None) over the chart range, for the chart builders"""
+    return lambda name, points=None, y=None: fetch_series(name, window, points, y)
+
+def section(name):
+    """Render a dashboard section as a fragment: it fetches only its own data, shows a
+    spinner until its charts are ready, reruns alone on interaction and logs its own timings"""
+    def decorator(render):
+        @st.fragment
+        def fragment(*args):
+            global run
+            page_run, run = run, RunTimings()
+            try:
+                with st.spinner(f"Loading {name}..."):
+                    render(*args)
+            except Exception as e:
+                st.error(f"Error loading {name}: {e}")
+                logger.exception(f"Dashboard section {name} failed")
+                run.log(status='error', section=name)
+            else:
+                run.log(section=name)
+            finally:
+                run = page_run
+        fragment.label = name
+        return fragment
+    return decorator
+
+def lazy_tabs(labels):
+    """Tabs that only run the selected tab's content, where this Streamlit version supports it"""
+    try:
+        return st.tabs(labels, key='section', on_change='rerun')
+    except TypeError:  # Older Streamlit: every tab runs
+        return st.tabs(labels)
+
+def chart_window():
+    """The chart range and bucket size picked by the viewer"""
+    range_col, resolution_col = st.columns(2)
+    with range_col:
+        preset = st.selectbox("Range", list(RANGES), index=list(RANGES).index('All'), key='range')
+    with resolution_col:
+        bucket = st.selectbox("Resolution", list(RESOLUTIONS), index=list(RESOLUTIONS).index('Daily'),
+                              key='resolution')
+    if preset != 'Custom':
+        window = charts.chart_window(preset, bucket)
     else:
-        return f"{num:.3f}"
+        today = pd.Timestamp.now().normalize()
+        dates = st.date_input("Custom range", (today - pd.Timedelta(days=30), today), key='custom_range')
+        if len(dates) != 2:
+            window = charts.chart_window(preset, bucket)
+        else:
+            end = pd.Timestamp(dates[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            window = charts.chart_window(preset, bucket, dates[0].isoformat(), end.isoformat())
+    if window['bucket'] != bucket:
+        st.caption(f"Hourly is available for ranges up to {charts.HOURLY_MAX_DAYS} days; showing {window['bucket']}.")
+    return window
+
+@section('Supply')
+def supply_section(window):
+    plot_charts(charts.supply_charts(section_fetch(window), window['bucket']))
+
+@section('Troves')
+def troves_section(window):
+    plot_charts(charts.troves_charts(section_fetch(window), window['bucket']))
+
+@section('MOOR Staking')
+def staking_section(window):
+    plot_charts(charts.staking_charts(section_fetch(window), window['bucket']))
+
+    # Realized staking yield over any window, from the API's staking ledger
+    today = pd.Timestamp.now().normalize()
+    staking_window = st.date_input("Staking window",
+                                   (today - pd.Timedelta(days=14), today),
+                                   key='staking_window')
+    if len(staking_window) == 2:
+        window_start, window_end = staking_window
+        staking = fetch_staking(window_start.isoformat(),
+                                (window_end + pd.Timedelta(days=1)).isoformat())
+        metric_cards(charts.staking_cards(staking))
+
+@section('Stability Pool')
+def stability_pool_section(window):
+    plot_charts(charts.stability_pool_charts(section_fetch(window), window['bucket']))
+
+@section('Redemptions')
+def redemptions_section(window):
+    plot_charts(charts.redemptions_charts(section_fetch(window), window['bucket']), "No redemptions yet.")
+
+@section('Liquidations')
+def liquidations_section(window):
+    plot_charts(charts.liquidations_charts(section_fetch(window), window['bucket']), "No liquidations yet.")
+
+SECTIONS = [supply_section, troves_section, staking_section, stability_pool_section,
+            redemptions_section, liquidations_section]
 
 # Streamlit app
+init_metrics_server()
 st.set_page_config(page_title="Moor Analytics")
 st.title('Moor Analytics')
 
@@ -280,269 +213,40 @@ footer {visibility: hidden;}
 """
 st.markdown(hide_deploy_button, unsafe_allow_html=True)
 
-# Add metrics section
-col1, col2, col3, col4, col5 = st.columns(5)
+window = chart_window()
 
-try:
-    # Fetch all data
-    df = fetch_and_process_data()
-    mint_df, burn_df = fetch_mint_burn_data()
-    trove_data = fetch_trove_data()
-    moor_data = fetch_moor_staking_data()
-    stability_pool_data = fetch_stability_pool_data()
-    redemption_data = fetch_redemption_data()
-    liquidation_data = fetch_liquidation_data()
-    
-    # Calculate current and 2-week-ago values for each metric
-    two_weeks_ago = pd.Timestamp.now() - pd.Timedelta(days=14)
-
-    # 1. Total USDM Supply
-    current_supply = df.iloc[-1]['amount'] if not df.empty else 0
-    past_df = df[df['timestamp'] < two_weeks_ago]
-    past_supply = past_df.iloc[-1]['amount'] if not past_df.empty else current_supply
-    supply_delta = current_supply - past_supply
-
-    # 2. Total Troves
-    current_troves = trove_data.groupby('timestamp')['active_troves'].sum().iloc[-1] if not trove_data.empty else 0
-    past_troves_series = trove_data[pd.to_datetime(trove_data['timestamp']) < two_weeks_ago].groupby('timestamp')['active_troves'].sum()
-    past_troves = past_troves_series.iloc[-1] if not past_troves_series.empty else current_troves
-    troves_delta = current_troves - past_troves
-
-    # 3. Stability Pool Deposits
-    current_sp = stability_pool_data.iloc[-1]['total_deposited'] if not stability_pool_data.empty else 0
-    past_sp_df = stability_pool_data[pd.to_datetime(stability_pool_data['timestamp']) < two_weeks_ago]
-    past_sp = past_sp_df.iloc[-1]['total_deposited'] if not past_sp_df.empty else current_sp
-    sp_delta = current_sp - past_sp
-
-    # 4. Total MOOR Staked
-    current_moor = moor_data.iloc[-1]['total_staked'] if not moor_data.empty else 0
-    past_moor_df = moor_data[pd.to_datetime(moor_data['timestamp']) < two_weeks_ago]
-    past_moor = past_moor_df.iloc[-1]['total_staked'] if not past_moor_df.empty else current_moor
-    moor_delta = current_moor - past_moor
-
-    # 5. Total Liquidations (last 2 weeks)
-    current_liquidations = liquidation_data[pd.to_datetime(liquidation_data['timestamp']) >= two_weeks_ago]['debt'].sum() if not liquidation_data.empty else 0
-    past_liquidations_df = liquidation_data[(pd.to_datetime(liquidation_data['timestamp']) < two_weeks_ago) & 
-                                           (pd.to_datetime(liquidation_data['timestamp']) >= two_weeks_ago - pd.Timedelta(days=14))]
-    past_liquidations = past_liquidations_df['debt'].sum() if not past_liquidations_df.empty else 0
-    liquidations_delta = current_liquidations - past_liquidations
-
-    # Calculate total mints for last 2 weeks
-    two_weeks_mints = mint_df[pd.to_datetime(mint_df['timestamp']) >= two_weeks_ago]['amount'].sum()
-    two_week_distribution = two_weeks_mints / 200  # USDM distributed to MOOR stakers
-    
-    # Calculate MOOR APR
-    if current_moor > 0:  # Avoid division by zero
-        annual_distribution = two_week_distribution * 26  # Annualize the distribution
-        apr = (annual_distribution / current_moor) * 100  # Convert to percentage
-    else:
-        apr = 0
-
-    # Display metrics
-    with col1:
-        st.metric("Total USDM (2W Δ)", 
-                 format_number(current_supply), 
-                 format_number(supply_delta))
-    with col2:
-        st.metric("Troves (2W Δ)", 
-                 f"{current_troves:,.0f}", 
-                 f"{troves_delta:+,.0f}")
-    with col3:
-        st.metric("SP Deposits (2W Δ)", 
-                 format_number(current_sp), 
-                 format_number(sp_delta))
-    with col4:
-        st.metric("MOOR Staked (2W Δ)", 
-                 format_number(current_moor), 
-                 format_number(moor_delta))
-    with col5:
-        st.metric("USDM to Stakers (2W)", 
-                 f"{format_number(two_week_distribution)}")
-    
-    # Total Supply Chart
-    st.subheader('USDM Total Supply Over Time')
-    fig_supply = px.line(df, 
-                        x='timestamp', 
-                        y='amount',
-                        title='USDM Total Supply',
-                        labels={'timestamp': 'Date', 'amount': 'USDM Supply'})
-    st.plotly_chart(fig_supply)
-    
-    # Convert mint amounts to positive and burn amounts to negative
-    if not mint_df.empty:
-        mint_df['type'] = 'Mint'
-    if not burn_df.empty:
-        burn_df['type'] = 'Burn'
-        burn_df['amount'] = -burn_df['amount']  # Make burns negative
-
-    # Combine mint and burn data
-    combined_df = pd.concat([mint_df, burn_df])
-
-    # Mint and Burn Combined Chart
-    st.subheader('USDM Mints and Burns')
-    fig_combined = px.bar(combined_df,
-                         x='timestamp',
-                         y='amount',
-                         color='type',
-                         title='Daily USDM Mints and Burns',
-                         labels={'timestamp': 'Date', 'amount': 'USDM Amount'},
-                         color_discrete_map={'Mint': 'green', 'Burn': 'red'})
-    
-    # Update layout to make it more readable
-    fig_combined.update_layout(
-        barmode='relative',  # Allows bars to stack from zero
-        yaxis_title='USDM Amount (+ Mints, - Burns)',
-        showlegend=True
-    )
-    st.plotly_chart(fig_combined)
-    
-    # Add Troves Count Chart
-    st.subheader('Active Troves Count Over Time')
-    fig_troves = px.bar(trove_data,
-                       x='timestamp',
-                       y='active_troves',
-                       color='asset',
-                       title='Number of Active Troves by Asset',
-                       labels={'timestamp': 'Date', 
-                              'active_troves': 'Number of Active Troves',
-                              'asset': 'Asset Type'})
-    
-    # Update layout to stack the bars
-    fig_troves.update_layout(
-        barmode='stack',
-        xaxis_title='Date',
-        yaxis_title='Number of Active Troves'
-    )
-    st.plotly_chart(fig_troves)
-    
-    # Add MOOR Staking Charts
-    st.subheader('MOOR Staking Activity')
-    
-    # Daily Stakes/Unstakes
-    fig_moor_daily = px.bar(moor_data,
-                          x='timestamp',
-                          y='amount',
-                          color='type',
-                          title='Daily MOOR Stakes and Unstakes',
-                          labels={'timestamp': 'Date', 
-                                 'amount': 'MOOR Amount',
-                                 'type': 'Action'},
-                          color_discrete_map={'Stake': 'green', 'Unstake': 'red'})
-    fig_moor_daily.update_layout(
-        barmode='relative',
-        yaxis_title='MOOR Amount (+ Stakes, - Unstakes)',
-        showlegend=True
-    )
-    st.plotly_chart(fig_moor_daily)
-    
-    # Total Staked MOOR Over Time
-    fig_moor_total = px.line(moor_data,
-                           x='timestamp',
-                           y='total_staked',
-                           title='Total MOOR Staked Over Time',
-                           labels={'timestamp': 'Date',
-                                  'total_staked': 'Total MOOR Staked'})
-    st.plotly_chart(fig_moor_total)
-    
-    # Add Stability Pool Charts
-    st.subheader('Stability Pool Activity')
-    
-    # Daily Deposits/Withdrawals
-    fig_sp_daily = px.bar(stability_pool_data,
-                         x='timestamp',
-                         y='amount',
-                         color='type',
-                         title='Daily Stability Pool Deposits and Withdrawals',
-                         labels={'timestamp': 'Date', 
-                                'amount': 'USDM Amount',
-                                'type': 'Action'},
-                         color_discrete_map={'Deposit': 'green', 'Withdrawal': 'red'})
-    fig_sp_daily.update_layout(
-        barmode='relative',
-        yaxis_title='USDM Amount (+ Deposits, - Withdrawals)',
-        showlegend=True
-    )
-    st.plotly_chart(fig_sp_daily)
-    
-    # Total Deposited USDM Over Time
-    fig_sp_total = px.line(stability_pool_data,
-                          x='timestamp',
-                          y='total_deposited',
-                          title='Total USDM in Stability Pool Over Time',
-                          labels={'timestamp': 'Date',
-                                 'total_deposited': 'Total USDM Deposited'})
-    st.plotly_chart(fig_sp_total)
-    
-    # Redemption Analytics Section
-    if not redemption_data.empty:
-        st.subheader('Redemption Activity')
-        
-        daily_redemptions = redemption_data.groupby(
-            [redemption_data['timestamp'].dt.date, 'asset']
-        ).agg({
-            'usdm_amount': 'sum',
-            'collateral_amount': 'sum'
-        }).reset_index()
-        
-        daily_redemptions['redemption_rate'] = (
-            daily_redemptions['collateral_amount'] / daily_redemptions['usdm_amount']
-        )
-        
-        # Redemption Volume Chart
-        fig_redemptions = px.bar(daily_redemptions,
-                                x='timestamp',
-                                y='usdm_amount',
-                                color='asset',
-                                title='Daily USDM Redemptions by Asset',
-                                labels={'timestamp': 'Date',
-                                       'usdm_amount': 'USDM Amount Redeemed',
-                                       'asset': 'Asset Type'})
-        st.plotly_chart(fig_redemptions)
-        
-        # Redemption Rate Chart
-        fig_rates = px.line(daily_redemptions,
-                            x='timestamp',
-                            y='redemption_rate',
-                            color='asset',
-                            title='Daily Redemption Rates by Asset',
-                            labels={'timestamp': 'Date',
-                                   'redemption_rate': 'Collateral/USDM Rate',
-                                   'asset': 'Asset Type'})
-        st.plotly_chart(fig_rates)
-
-    # Liquidation Analytics Section
-    if not liquidation_data.empty:
-        st.subheader('Liquidation Activity')
-        
-        # Liquidation Volume Chart
-        fig_liquidations = px.bar(liquidation_data,
-                                 x='timestamp',
-                                 y='debt',
-                                 color='asset',
-                                 pattern_shape='type',
-                                 title='Daily Liquidation Volume by Asset',
-                                 labels={'timestamp': 'Date',
-                                        'debt': 'USDM Debt Liquidated',
-                                        'asset': 'Asset Type',
-                                        'type': 'Liquidation Type'})
-        st.plotly_chart(fig_liquidations)
-        
-        # Liquidation Collateral Chart
-        fig_liquidation_collateral = px.bar(liquidation_data,
-                                           x='timestamp',
-                                           y='collateral',
-                                           color='asset',
-                                           pattern_shape='type',
-                                           title='Daily Collateral Liquidated by Asset',
-                                           labels={'timestamp': 'Date',
-                                                  'collateral': 'Collateral Amount Liquidated',
-                                                  'asset': 'Asset Type',
-                                                  'type': 'Liquidation Type'})
-        st.plotly_chart(fig_liquidation_collateral)
+# Filled after the selected section, so its first chart only waits for its own data
+kpi_container = st.container()
 
+# Profile this run when sampled or when the viewer passes ?profile=<PROFILE_TOKEN>
+profile_token = st.query_params.get('profile') or st.context.headers.get('X-Profile')
+profile = Profile('dashboard', should_profile(profile_token)).__enter__()
+
+try:
+    # Only the selected tab's section runs, each as its own fragment
+    for tab, render_section in zip(lazy_tabs([render.label for render in SECTIONS]), SECTIONS):
+        with tab:
+            if getattr(tab, 'open', None) is not False:
+                render_section(window)
+
+    with kpi_container:
+        snapshot = fetch_snapshot()
+        # Deltas over the chart range
+        kpis = fetch_kpis(window)['kpis']
+        if snapshot.get('stale'):
+            st.warning(f"Showing data from {snapshot['generated_at'][:16].replace('T', ' ')}; "
+                       "the data source is currently unavailable and updates are paused.")
+        metric_cards(charts.kpi_cards(kpis, window['label']))
 
 except Exception as e:
     import traceback
     st.error(f"Error fetching or displaying data: {str(e)}")
     st.error(f"Error type: {type(e).__name__}")
     st.error(f"Full traceback: {traceback.format_exc()}")
+    run.log(status='error')
+else:
+    run.log()
+finally:
+    profile.__exit__(None, None, None)
+    if profile.path:
+        logger.info(f"Profile written to {profile.path}")
@@ -0,0 +1,305 @@
+"""Chart and KPI card building shared by the Streamlit app and the static export.
+
+Each section's charts are built from a `fetch(name, points=None, y=None)`
+callable returning a series as a DataFrame, so the app can pass its cached
+fetch and the export a plain one.
+"""
+import os
+from urllib.parse import urlencode
+
+import pandas as pd
+import plotly.express as px
+
+# Point budget per line chart: about one point per horizontal pixel in the default page layout
+CHART_POINTS = int(os.getenv('CHART_POINTS', 700))
+# Chart range presets in days (None: the whole history), and bucket sizes
+RANGES = {'7d': 7, '30d': 30, '90d': 90, 'All': None, 'Custom': None}
+RESOLUTIONS = {'Hourly': '1h', 'Daily': '1D', 'Weekly': '7D'}
+# Longest range served hourly: the api answers at most collateral.MAX_BUCKETS (10,000) buckets
+HOURLY_MAX_DAYS = 10_000 // 24
+
+
+def chart_window(preset='All', bucket='Daily', start=None, end=None):
+    """Chart range and bucket size for a range preset, or for `start`/`end` with Custom;
+    Hourly becomes Daily for the whole history and ranges over HOURLY_MAX_DAYS"""
+    if RANGES.get(preset):
+        # Day-aligned, so a preset's requests stay cacheable for the whole day
+        start = (pd.Timestamp.now().normalize() - pd.Timedelta(days=RANGES[preset])).isoformat()
+    if bucket == 'Hourly' and (start is None or pd.Timestamp(end or pd.Timestamp.now()) - pd.Timestamp(start)
+                               > pd.Timedelta(days=HOURLY_MAX_DAYS)):
+        bucket = 'Daily'
+    return {'label': preset if preset != 'Custom' else 'range', 'start': start, 'end': end,
+            'resolution': RESOLUTIONS[bucket], 'bucket': bucket}
+
+
+def series_endpoint(name, start=None, end=None, resolution=None, points=None, y=None):
+    """API path of one series over a range, downsampled to `points` per line"""
+    # The whole history at daily resolution is served precomputed, so only other views pass a range
+    params = {'start': start, 'end': end, 'resolution': resolution if resolution != '1D' else None,
+              'points': points, 'y': y if points else None}
+    query = urlencode({key: value for key, value in params.items() if value})
+    return f"/series/{name}" + (f"?{query}" if query else "")
+
+
+def kpis_endpoint(window):
+    return "/kpis?" + urlencode({key: window[key] for key in ('start', 'end') if window[key]})
+
+
+def decode_series(payload):
+    """A series response as a DataFrame with parsed timestamps"""
+    df = pd.DataFrame(payload['data'])
+    if not df.empty:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+def format_number(num):
+    """Format numbers to human readable format with K and M suffixes"""
+    if abs(num) >= 1_000_000:
+        return f"{num/1_000_000:.3f}M"
+    elif abs(num) >= 1_000:
+        return f"{num/1_000:.1f}K"
+    else:
+        return f"{num:.3f}"
+
+
+def kpi_cards(kpis, label):
+    """(title, value, delta) of each KPI card, deltas over the range named `label`"""
+    return [
+        (f"Total USDM ({label} Δ)", format_number(kpis['supply']), format_number(kpis['supply_delta'])),
+        (f"Troves ({label} Δ)", f"{kpis['troves']:,.0f}", f"{kpis['troves_delta']:+,.0f}"),
+        (f"SP Deposits ({label} Δ)", format_number(kpis['sp_deposits']), format_number(kpis['sp_deposits_delta'])),
+        (f"MOOR Staked ({label} Δ)", format_number(kpis['moor_staked']), format_number(kpis['moor_staked_delta'])),
+        (f"USDM to Stakers ({label})", format_number(kpis['staker_rewards']), None),
+    ]
+
+
+def staking_cards(staking):
+    """(title, value, delta) of the staking window cards"""
+    return [
+        ("Avg MOOR Staked", format_number(staking['average_staked']), None),
+        ("USDM to Stakers", format_number(staking['rewards']), None),
+        ("Realized APR", f"{staking['realized_apr']:.2f}%", None),
+    ]
+
+
+def supply_charts(fetch, bucket):
+    """(subheader, figure) pairs of the Supply section"""
+    # Line charts get a point budget per line; bar charts every daily row
+    df = fetch('supply', CHART_POINTS)
+    combined_df = fetch('mint_burn')
+
+    # Total Supply Chart
+    fig_supply = px.line(df,
+                        x='timestamp',
+                        y='amount',
+                        title='USDM Total Supply',
+                        labels={'timestamp': 'Date', 'amount': 'USDM Supply'})
+
+    # Mint and Burn Combined Chart
+    fig_combined = px.bar(combined_df,
+                         x='timestamp',
+                         y='amount',
+                         color='type',
+                         title=f"{bucket} USDM Mints and Burns",
+                         labels={'timestamp': 'Date', 'amount': 'USDM Amount'},
+                         color_discrete_map={'Mint': 'green', 'Burn': 'red'})
+
+    # Update layout to make it more readable
+    fig_combined.update_layout(
+        barmode='relative',  # Allows bars to stack from zero
+        yaxis_title='USDM Amount (+ Mints, - Burns)',
+        showlegend=True
+    )
+    return [('USDM Total Supply Over Time', fig_supply), ('USDM Mints and Burns', fig_combined)]
+
+
+def troves_charts(fetch, bucket):
+    """(subheader, figure) pairs of the Troves section"""
+    trove_data = fetch('troves', CHART_POINTS)
+    collateral_data = fetch('collateral', CHART_POINTS, 'collateral')
+    debt_data = fetch('collateral', CHART_POINTS, 'debt')
+    tcr_data = fetch('collateral', CHART_POINTS, 'tcr')
+
+    # Add Troves Count Chart
+    # One row per day the count changed; each value holds until the next row
+    fig_troves = px.line(trove_data,
+                         x='timestamp',
+                         y='active_troves',
+                         color='asset',
+                         line_shape='hv',
+                         title='Number of Active Troves by Asset',
+                         labels={'timestamp': 'Date',
+                                'active_troves': 'Number of Active Troves',
+                                'asset': 'Asset Type'})
+    fig_troves.update_layout(
+        xaxis_title='Date',
+        yaxis_title='Number of Active Troves'
+    )
+
+    # Collateral and Debt Charts
+    fig_collateral = px.line(collateral_data,
+                             x='timestamp',
+                             y='collateral',
+                             color='asset',
+                             title='Total Collateral by Asset',
+                             labels={'timestamp': 'Date',
+                                    'collateral': 'Collateral',
+                                    'asset': 'Asset Type'})
+
+    fig_debt = px.line(debt_data,
+                       x='timestamp',
+                       y='debt',
+                       color='asset',
+                       title='Total USDM Debt by Asset',
+                       labels={'timestamp': 'Date',
+                              'debt': 'USDM Debt',
+                              'asset': 'Asset Type'})
+
+    # Priced at each asset's latest redemption; the API drops rows before the first one
+    fig_tcr = px.line(tcr_data,
+                      x='timestamp',
+                      y='tcr',
+                      color='asset',
+                      title='Implied Total Collateral Ratio by Asset',
+                      labels={'timestamp': 'Date',
+                             'tcr': 'TCR (%)',
+                             'asset': 'Asset Type'})
+    return [('Active Troves Count Over Time', fig_troves), (None, fig_collateral),
+            (None, fig_debt), (None, fig_tcr)]
+
+
+def staking_charts(fetch, bucket):
+    """(subheader, figure) pairs of the MOOR Staking section"""
+    moor_data = fetch('moor_staking')
+    moor_total_data = fetch('moor_staking', CHART_POINTS)
+
+    # Daily Stakes/Unstakes
+    fig_moor_daily = px.bar(moor_data,
+                          x='timestamp',
+                          y='amount',
+                          color='type',
+                          title=f"{bucket} MOOR Stakes and Unstakes",
+                          labels={'timestamp': 'Date',
+                                 'amount': 'MOOR Amount',
+                                 'type': 'Action'},
+                          color_discrete_map={'Stake': 'green', 'Unstake': 'red'})
+    fig_moor_daily.update_layout(
+        barmode='relative',
+        yaxis_title='MOOR Amount (+ Stakes, - Unstakes)',
+        showlegend=True
+    )
+
+    # Total Staked MOOR Over Time
+    fig_moor_total = px.line(moor_total_data,
+                           x='timestamp',
+                           y='total_staked',
+                           title='Total MOOR Staked Over Time',
+                           labels={'timestamp': 'Date',
+                                  'total_staked': 'Total MOOR Staked'})
+    return [(None, fig_moor_daily), (None, fig_moor_total)]
+
+
+def stability_pool_charts(fetch, bucket):
+    """(subheader, figure) pairs of the Stability Pool section"""
+    stability_pool_data = fetch('stability_pool')
+    stability_pool_total_data = fetch('stability_pool', CHART_POINTS)
+
+    # Daily Deposits/Withdrawals
+    fig_sp_daily = px.bar(stability_pool_data,
+                         x='timestamp',
+                         y='amount',
+                         color='type',
+                         title=f"{bucket} Stability Pool Deposits and Withdrawals",
+                         labels={'timestamp': 'Date',
+                                'amount': 'USDM Amount',
+                                'type': 'Action'},
+                         color_discrete_map={'Deposit': 'green', 'Withdrawal': 'red'})
+    fig_sp_daily.update_layout(
+        barmode='relative',
+        yaxis_title='USDM Amount (+ Deposits, - Withdrawals)',
+        showlegend=True
+    )
+
+    # Total Deposited USDM Over Time
+    fig_sp_total = px.line(stability_pool_total_data,
+                          x='timestamp',
+                          y='total_deposited',
+                          title='Total USDM in Stability Pool Over Time',
+                          labels={'timestamp': 'Date',
+                                 'total_deposited': 'Total USDM Deposited'})
+    return [(None, fig_sp_daily), (None, fig_sp_total)]
+
+
+def redemptions_charts(fetch, bucket):
+    """(subheader, figure) pairs of the Redemptions section; none before the first redemption"""
+    daily_redemptions = fetch('redemptions')
+    redemption_rate_data = fetch('redemptions', CHART_POINTS)
+
+    if daily_redemptions.empty:
+        return []
+
+    # Redemption Volume Chart
+    fig_redemptions = px.bar(daily_redemptions,
+                            x='timestamp',
+                            y='usdm_amount',
+                            color='asset',
+                            title=f"{bucket} USDM Redemptions by Asset",
+                            labels={'timestamp': 'Date',
+                                   'usdm_amount': 'USDM Amount Redeemed',
+                                   'asset': 'Asset Type'})
+
+    # Redemption Rate Chart
+    fig_rates = px.line(redemption_rate_data,
+                        x='timestamp',
+                        y='redemption_rate',
+                        color='asset',
+                        title=f"{bucket} Redemption Rates by Asset",
+                        labels={'timestamp': 'Date',
+                               'redemption_rate': 'Collateral/USDM Rate',
+                               'asset': 'Asset Type'})
+    return [(None, fig_redemptions), (None, fig_rates)]
+
+
+def liquidations_charts(fetch, bucket):
+    """(subheader, figure) pairs of the Liquidations section; none before the first liquidation"""
+    liquidation_data = fetch('liquidations')
+
+    if liquidation_data.empty:
+        return []
+
+    # Liquidation Volume Chart
+    fig_liquidations = px.bar(liquidation_data,
+                             x='timestamp',
+                             y='debt',
+                             color='asset',
+                             pattern_shape='type',
+                             title=f"{bucket} Liquidation Volume by Asset",
+                             labels={'timestamp': 'Date',
+                                    'debt': 'USDM Debt Liquidated',
+                                    'asset': 'Asset Type',
+                                    'type': 'Liquidation Type'})
+
+    # Liquidation Collateral Chart
+    fig_liquidation_collateral = px.bar(liquidation_data,
+                                       x='timestamp',
+                                       y='collateral',
+                                       color='asset',
+                                       pattern_shape='type',
+                                       title=f"{bucket} Collateral Liquidated by Asset",
+                                       labels={'timestamp': 'Date',
+                                              'collateral': 'Collateral Amount Liquidated',
+                                              'asset': 'Asset Type',
+                                              'type': 'Liquidation Type'})
+    return [(None, fig_liquidations), (None, fig_liquidation_collateral)]
+
+
+# Section label, chart builder, and what to show when it has no charts
+SECTIONS = [
+    ('Supply', supply_charts, None),
+    ('Troves', troves_charts, None),
+    ('MOOR Staking', staking_charts, None),
+    ('Stability Pool', stability_pool_charts, None),
+    ('Redemptions', redemptions_charts, "No redemptions yet."),
+    ('Liquidations', liquidations_charts, "No liquidations yet."),
+]
@@ -0,0 +1,169 @@
+"""Headless export of the dashboard to static HTML and JSON.
+
+Renders every section's charts and the KPI cards with the same builders as the
+Streamlit app (charts.py) into a new generation directory, then atomically
+repoints the `current` symlink at it, so a static file server pointed at
+EXPORT_DIR/current never serves a half-written export. Run it once, or with
+--interval to re-export on a schedule.
+
+Usage:
+    python export.py [--range 7d|30d|90d|All] [--resolution Hourly|Daily|Weekly] [--interval SECONDS]
+"""
+import argparse
+import html
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import requests
+from plotly.offline import get_plotlyjs
+
+import charts
+from instrumentation import logger
+
+API_URL = os.getenv('API_URL', 'http://localhost:8000')
+API_TIMEOUT = 30
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'export')
+# Generations kept besides the current one, for viewers still loading the previous export
+KEEP_GENERATIONS = 1
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Moor Analytics</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{font-family: sans-serif; max-width: 1100px; margin: 0 auto; padding: 1rem;}}
+.cards {{display: flex; gap: 1rem; flex-wrap: wrap;}}
+.card {{flex: 1; min-width: 150px;}}
+.card .title {{font-size: 0.85rem; color: #555;}}
+.card .value {{font-size: 1.8rem;}}
+.card .delta {{font-size: 0.9rem; color: #09ab3b;}}
+.card .delta.negative {{color: #ff2b2b;}}
+.generated {{color: #777; font-size: 0.85rem;}}
+</style>
+</head>
+<body>
+<h1>Moor Analytics</h1>
+<p class="generated">Updated {generated_at}{stale}</p>
+{body}
+</body>
+</html>
+"""
+
+
+def get_json(endpoint):
+    response = requests.get(f"{API_URL}{endpoint}", timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def cards_html(cards):
+    items = []
+    for title, value, delta in cards:
+        delta_html = ''
+        if delta is not None:
+            negative = ' negative' if delta.startswith('-') else ''
+            delta_html = f'<div class="delta{negative}">{html.escape(delta)}</div>'
+        items.append(f'<div class="card"><div class="title">{html.escape(title)}</div>'
+                     f'<div class="value">{html.escape(value)}</div>{delta_html}</div>')
+    return f'<div class="cards">{"".join(items)}</div>'
+
+
+def render(window):
+    """The page body and its JSON documents for one chart window"""
+    def fetch(name, points=None, y=None):
+        return charts.decode_series(get_json(charts.series_endpoint(
+            name, window['start'], window['end'], window['resolution'], points, y)))
+
+    snapshot = get_json('/snapshot')
+    kpis = get_json(charts.kpis_endpoint(window))
+    body = [cards_html(charts.kpi_cards(kpis['kpis'], window['label']))]
+    figures = {}
+    for label, build, empty_message in charts.SECTIONS:
+        body.append(f'<h2>{html.escape(label)}</h2>')
+        built = build(fetch, window['bucket'])
+        if not built and empty_message:
+            body.append(f'<p>{html.escape(empty_message)}</p>')
+        for index, (subheader, fig) in enumerate(built):
+            if subheader:
+                body.append(f'<h3>{html.escape(subheader)}</h3>')
+            body.append(fig.to_html(full_html=False, include_plotlyjs=False))
+            figures[f"{label.lower().replace(' ', '_')}_{index}"] = fig.to_json()
+        if label == 'MOOR Staking':
+            # The app's staking window defaults to the last two weeks, as does /staking
+            body.append('<h3>Last two weeks</h3>')
+            body.append(cards_html(charts.staking_cards(get_json('/staking'))))
+    page = PAGE.format(
+        generated_at=html.escape(snapshot['generated_at'][:16].replace('T', ' ')),
+        stale=' (the data source is unavailable; updates are paused)' if snapshot.get('stale') else '',
+        body='\n'.join(body),
+    )
+    data = {'generated_at': snapshot['generated_at'], 'window': window, **kpis}
+    return page, data, figures
+
+
+def export(window, export_dir=EXPORT_DIR):
+    """Write one export generation and make it current; return its directory"""
+    started = time.perf_counter()
+    page, data, figures = render(window)
+    generations = os.path.join(export_dir, 'generations')
+    path = os.path.join(generations, datetime.now().strftime('%Y%m%dT%H%M%S%f'))
+    os.makedirs(os.path.join(path, 'charts'))
+    with open(os.path.join(path, 'index.html'), 'w') as f:
+        f.write(page)
+    with open(os.path.join(path, 'plotly.min.js'), 'w') as f:
+        f.write(get_plotlyjs())
+    with open(os.path.join(path, 'kpis.json'), 'w') as f:
+        json.dump(data, f)
+    for name, figure in figures.items():
+        with open(os.path.join(path, 'charts', f"{name}.json"), 'w') as f:
+            f.write(figure)
+
+    # A rename over the old symlink is atomic; readers see the old export or the new one
+    current = os.path.join(export_dir, 'current')
+    link = f"{current}.tmp"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.relpath(path, export_dir), link)
+    os.replace(link, current)
+
+    for old in sorted(os.listdir(generations))[:-(KEEP_GENERATIONS + 1)]:
+        shutil.rmtree(os.path.join(generations, old))
+    logger.info(json.dumps({
+        'event': 'dashboard_export',
+        'path': path,
+        'charts': len(figures),
+        'total_ms': round((time.perf_counter() - started) * 1000, 2),
+    }))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the dashboard to static HTML and JSON')
+    parser.add_argument('--range', default='All', choices=[name for name in charts.RANGES if name != 'Custom'],
+                        help='Chart range (default: All)')
+    parser.add_argument('--resolution', default='Daily', choices=list(charts.RESOLUTIONS),
+                        help='Chart bucket size (default: Daily)')
+    parser.add_argument('--interval', type=int,
+                        help='Re-export every this many seconds instead of once')
+    args = parser.parse_args()
+
+    while True:
+        try:
+            export(charts.chart_window(args.range, args.resolution))
+        except Exception:
+            if not args.interval:
+                raise
+            # Keep serving the previous export until the next attempt
+            logger.exception("Dashboard export failed")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Timing instrumentation for dashboard script runs.
+
+Each Streamlit run collects per-stage timings (API fetch, DataFrame
+construction, chart rendering) and cache hits/misses, and logs them as one
+JSON line when the run ends. When DASHBOARD_METRICS_PORT is set the same
+measurements are also exported as Prometheus metrics on that port.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+DASHBOARD_METRICS_PORT = os.getenv('DASHBOARD_METRICS_PORT')
+
+logger = logging.getLogger('moor.dashboard')
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+STAGE_SECONDS = Histogram(
+    'moor_dashboard_stage_seconds', "Dashboard run time per stage", ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+RUN_SECONDS = Histogram(
+    'moor_dashboard_run_seconds', "Total time of one dashboard script run",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+SECTION_SECONDS = Histogram(
+    'moor_dashboard_section_seconds', "Time to render one dashboard section", ['section'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+CACHE_REQUESTS = Counter(
+    'moor_dashboard_cache_requests_total', "st.cache_data lookups by outcome", ['function', 'result'])
+RESPONSE_BYTES = Counter(
+    'moor_dashboard_api_bytes_total', "Bytes read from the api", ['endpoint'])
+
+
+def start_metrics_server():
+    """Expose the dashboard metrics on DASHBOARD_METRICS_PORT, if configured"""
+    if DASHBOARD_METRICS_PORT:
+        start_http_server(int(DASHBOARD_METRICS_PORT))
+
+
+class RunTimings:
+    """Stage timings and cache outcomes for one script run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.cache = {}
+        self.bytes_read = 0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            STAGE_SECONDS.labels(name.split(':')[0]).observe(elapsed)
+
+    def cached_call(self, function, fn, *args):
+        """Call an st.cache_data function, counting it as a miss if its body ran"""
+        misses_before = self.cache.get(function, {}).get('misses', 0)
+        result = fn(*args)
+        counts = self.cache.setdefault(function, {'hits': 0, 'misses': 0})
+        if counts['misses'] == misses_before:
+            counts['hits'] += 1
+            CACHE_REQUESTS.labels(function, 'hit').inc()
+        return result
+
+    def cache_miss(self, function):
+        """Called from inside a cached function body, which only runs on a miss"""
+        counts = self.cache.setdefault(function, {'hits': 0, 'misses': 0})
+        counts['misses'] += 1
+        CACHE_REQUESTS.labels(function, 'miss').inc()
+
+    def response_read(self, endpoint, size):
+        self.bytes_read += size
+        RESPONSE_BYTES.labels(endpoint).inc(size)
+
+    def log(self, status='ok', section=None):
+        """Emit the run's timings, or one section's, as one structured log line"""
+        total = time.perf_counter() - self.started
+        if section is None:
+            RUN_SECONDS.observe(total)
+        else:
+            SECTION_SECONDS.labels(section).observe(total)
+        logger.info(json.dumps({
+            'event': 'dashboard_run' if section is None else 'dashboard_section',
+            **({'section': section} if section is not None else {}),
+            'status': status,
+            'total_ms': round(total * 1000, 2),
+            'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            'cache': self.cache,
+            'api_bytes': self.bytes_read,
+        }))
@@ -0,0 +1 @@
+../api/profiling.py
\ No newline at end of file
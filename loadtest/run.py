@@ -0,0 +1,282 @@
+"""End-to-end HTTP load test for the FastAPI app in api/api.py.
+
+The app runs in-process behind an httpx ASGI transport, with its GraphQL client
+swapped for a stand-in upstream (fixtures or a JSONL recording, see standin/)
+wrapped in a counter, so every run is deterministic and needs no network.
+
+    # all scenarios against synthetic fixtures, 50 concurrent clients
+    python -m loadtest.run --fixtures standin/fixtures --concurrency 50
+
+    # cache-expiry case only: 2s TTL, 80ms simulated indexer latency
+    python -m loadtest.run --scenario expiry --ttl 2 --upstream-latency-ms 80
+
+    # an already running deployment (upstream calls are not observable)
+    python -m loadtest.run --url http://localhost:8000 --duration 30
+
+Scenarios:
+    cold    fresh process with WARMUP_TIMEOUT=0, so load starts while warmup is still
+            building the first snapshot (deploy / restart)
+    warm    every path requested once before measuring
+    expiry  short cache TTL, snapshot refresh interval and dataset cache TTL held under
+            sustained load, so cached responses expire and the snapshot is rebuilt from
+            the upstream mid-run; fails unless the upstream is queried again
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import httpx
+from gql import Client
+from gql.transport.transport import Transport
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, 'api')
+SCENARIOS = ('cold', 'warm', 'expiry')
+
+
+class CountingTransport(Transport):
+    """Count upstream GraphQL executions made through the wrapped transport"""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        self.transport.connect()
+
+    def close(self):
+        self.transport.close()
+
+    def execute(self, request, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        return self.transport.execute(request, *args, **kwargs)
+
+
+def make_upstream(args):
+    from standin.engine import FixtureStore
+    from standin.replay import FixtureTransport, ReplayTransport
+
+    if args.replay:
+        transport = ReplayTransport(args.replay, args.upstream_latency_ms, args.upstream_jitter_ms, seed=args.seed)
+    else:
+        transport = FixtureTransport(FixtureStore(args.fixtures), args.upstream_latency_ms,
+                                     args.upstream_jitter_ms, seed=args.seed)
+    return CountingTransport(transport)
+
+
+def load_api(upstream):
+    """Import api.py and point its GraphQL clients at the stand-in upstream"""
+    sys.path.insert(0, API_DIR)
+    import api
+    import datasets
+
+    datasets.configure(factory=lambda: Client(transport=upstream, fetch_schema_from_transport=False))
+    return api
+
+
+def parse_mix(mix):
+    """'/distribution:3,/snapshot:1' -> ([paths], [weights])"""
+    paths, weights = [], []
+    for item in mix.split(','):
+        path, _, weight = item.strip().partition(':')
+        paths.append(path)
+        weights.append(float(weight or 1))
+    return paths, weights
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(http, paths, weights, concurrency, duration, max_requests, seed):
+    """Issue requests from `concurrency` workers until the duration or request budget runs out"""
+    samples = []
+    deadline = time.perf_counter() + duration
+    issued = 0
+    rng = random.Random(seed)
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            path = rng.choices(paths, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await http.get(path)
+                status, error = response.status_code, response.status_code >= 400
+            except Exception as e:
+                status, error = type(e).__name__, True
+            samples.append((path, status, (time.perf_counter() - started) * 1000, error))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(scenario, samples, elapsed, upstream_calls):
+    latencies = sorted(s[2] for s in samples)
+    errors = sum(1 for s in samples if s[3])
+    per_path = {}
+    for path in sorted({s[0] for s in samples}):
+        path_latencies = sorted(s[2] for s in samples if s[0] == path)
+        per_path[path] = {
+            'requests': len(path_latencies),
+            'p50_ms': percentile(path_latencies, 50),
+            'p95_ms': percentile(path_latencies, 95),
+        }
+    return {
+        'scenario': scenario,
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None,
+        'upstream_calls': upstream_calls,
+        'upstream_calls_per_request': upstream_calls / len(samples) if samples and upstream_calls is not None else None,
+        'status_counts': {str(k): v for k, v in Counter(s[1] for s in samples).items()},
+        'paths': per_path,
+    }
+
+
+async def run_in_process(args, scenario):
+    upstream = make_upstream(args)
+    api = load_api(upstream)
+    paths, weights = parse_mix(args.mix)
+    transport = httpx.ASGITransport(app=api.app)
+    started = time.perf_counter()
+    async with api.app.router.lifespan_context(api.app):
+        # Startup includes the api's warmup, except in the cold scenario, which does not wait for it
+        startup_ms = (time.perf_counter() - started) * 1000
+        async with httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=args.timeout) as http:
+            if scenario == 'warm':
+                for path in paths:
+                    await http.get(path)
+            calls_before, built_before = upstream.calls, api.snapshot_built_at
+            samples, elapsed = await drive(http, paths, weights, args.concurrency, args.duration,
+                                           args.requests, args.seed)
+            rebuilt = api.snapshot_built_at != built_before
+    result = summarize(scenario, samples, elapsed, upstream.calls - calls_before)
+    result['startup_ms'] = startup_ms
+    if scenario == 'expiry' and not (rebuilt and result['upstream_calls']):
+        raise SystemExit("expiry: the snapshot was not rebuilt from the upstream during the run; "
+                         "raise --duration or lower --ttl")
+    return result
+
+
+async def run_live(args):
+    paths, weights = parse_mix(args.mix)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as http:
+        samples, elapsed = await drive(http, paths, weights, args.concurrency, args.duration,
+                                       args.requests, args.seed)
+    return summarize('live', samples, elapsed, None)
+
+
+def run_scenarios_isolated(args, scenarios):
+    """Run each scenario in a fresh interpreter so caches, imports and TTLs start clean"""
+    results = []
+    for scenario in scenarios:
+        with tempfile.NamedTemporaryFile(suffix='.json') as out:
+            argv = [sys.executable, '-m', 'loadtest.run', '--scenario', scenario, '--json-out', out.name, '--quiet']
+            argv += forwarded_args(args)
+            subprocess.run(argv, cwd=ROOT, check=True)
+            with open(out.name) as f:
+                results.extend(json.load(f))
+    return results
+
+
+def forwarded_args(args):
+    forwarded = ['--concurrency', str(args.concurrency), '--duration', str(args.duration),
+                 '--mix', args.mix, '--ttl', str(args.ttl), '--seed', str(args.seed),
+                 '--timeout', str(args.timeout),
+                 '--upstream-latency-ms', str(args.upstream_latency_ms),
+                 '--upstream-jitter-ms', str(args.upstream_jitter_ms)]
+    if args.requests is not None:
+        forwarded += ['--requests', str(args.requests)]
+    forwarded += ['--replay', args.replay] if args.replay else ['--fixtures', args.fixtures]
+    return forwarded
+
+
+def _fmt(value, spec='.1f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(results):
+    header = f"{'scenario':<8} {'reqs':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err%':>6} {'upstream':>8} {'up/req':>8} {'startup':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['scenario']:<8} {r['requests']:>7} {_fmt(r['throughput_rps']):>8} {_fmt(r['p50_ms']):>8} "
+              f"{_fmt(r['p95_ms']):>8} {_fmt(r['p99_ms']):>8} {_fmt(r['max_ms']):>8} "
+              f"{_fmt(r['error_rate'] * 100):>6} {_fmt(r['upstream_calls'], 'd'):>8} "
+              f"{_fmt(r['upstream_calls_per_request'], '.4f'):>8} {_fmt(r.get('startup_ms')):>8}")
+    print("latencies in ms; upstream = GraphQL calls made by the app, up/req = upstream calls per HTTP request, "
+          "startup = app startup, including warmup except in cold")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the stats API")
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--url', help="Load test a running server instead of the in-process app")
+    parser.add_argument('--fixtures', default=os.path.join(ROOT, 'standin', 'fixtures'),
+                        help="Stand-in fixture directory (see standin/generate.py)")
+    parser.add_argument('--replay', help="Serve the upstream from a JSONL recording instead of fixtures")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of load per scenario")
+    parser.add_argument('--requests', type=int, help="Stop after this many requests per scenario")
+    parser.add_argument('--mix', default='/distribution:1', help="Weighted paths, e.g. '/distribution:3,/snapshot:1'")
+    parser.add_argument('--ttl', type=int, default=2, help="Cache TTL in seconds for the expiry scenario")
+    parser.add_argument('--upstream-latency-ms', type=float, default=50.0)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=20.0)
+    parser.add_argument('--timeout', type=float, default=60.0, help="Per-request client timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json-out', help="Also write the results as JSON to this file")
+    parser.add_argument('--quiet', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.url:
+        results = [asyncio.run(run_live(args))]
+    elif args.scenario == 'all':
+        results = run_scenarios_isolated(args, SCENARIOS)
+    else:
+        if args.scenario == 'cold':
+            # Startup otherwise waits for warmup to prime the caches; must be set before api.py is imported
+            os.environ['WARMUP_TIMEOUT'] = '0'
+        elif args.scenario == 'expiry':
+            # Must be set before api.py is imported: the TTL is bound at decoration time.
+            # The snapshot is rebuilt every --ttl seconds too, and its datasets expire by
+            # then, so each rebuild queries the upstream rather than re-serving cached frames
+            os.environ['CACHE_TTL'] = str(args.ttl)
+            os.environ['SNAPSHOT_REFRESH_SECONDS'] = str(args.ttl)
+            os.environ['DATASET_CACHE_TTL'] = str(args.ttl)
+            os.environ.pop('EVENT_STORE_DIR', None)
+            if args.duration <= args.ttl:
+                parser.error("--duration must exceed --ttl for entries to expire under load")
+        results = [asyncio.run(run_in_process(args, args.scenario))]
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if not args.quiet:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Offline stand-in for the Hasura GraphQL endpoint used by the api, dashboard and rewards script
@@ -0,0 +1,178 @@
+"""Evaluate Hasura-style GraphQL queries against local fixture files.
+
+Only the subset of Hasura the stats code relies on is implemented: root fields
+named after the ``schema.graphql`` entities, aliases, ``where`` (comparison
+operators plus ``_and``/``_or``/``_not``), ``order_by``, ``limit`` and ``offset``.
+"""
+import json
+import os
+
+from graphql import (
+    FieldNode,
+    ObjectTypeDefinitionNode,
+    OperationDefinitionNode,
+    parse,
+)
+from graphql.utilities import value_from_ast_untyped
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.graphql')
+
+
+class QueryError(Exception):
+    """Raised for queries the stand-in cannot answer; reported as a GraphQL error"""
+
+
+def load_entity_names(schema_path=SCHEMA_PATH):
+    """Return the entity type names declared in schema.graphql"""
+    with open(schema_path) as f:
+        document = parse(f.read())
+    return {
+        definition.name.value
+        for definition in document.definitions
+        if isinstance(definition, ObjectTypeDefinitionNode)
+    }
+
+
+def _coerce(value):
+    # BigInt columns arrive as strings; compare them numerically
+    if isinstance(value, str):
+        stripped = value[1:] if value.startswith('-') else value
+        if stripped.isdigit():
+            return int(value)
+    return value
+
+
+def _compare(op, value, operand):
+    if op == '_is_null':
+        return (value is None) == bool(operand)
+    if value is None:
+        return False
+    value = _coerce(value)
+    if op in ('_in', '_nin'):
+        found = value in [_coerce(item) for item in operand]
+        return found if op == '_in' else not found
+    operand = _coerce(operand)
+    if op == '_eq':
+        return value == operand
+    if op == '_neq':
+        return value != operand
+    if op == '_gt':
+        return value > operand
+    if op == '_gte':
+        return value >= operand
+    if op == '_lt':
+        return value < operand
+    if op == '_lte':
+        return value <= operand
+    raise QueryError(f"Unsupported where operator: {op}")
+
+
+def matches(row, where):
+    """Return True if the row satisfies a Hasura ``where`` expression"""
+    for key, condition in where.items():
+        if key == '_and':
+            if not all(matches(row, c) for c in condition):
+                return False
+        elif key == '_or':
+            if not any(matches(row, c) for c in condition):
+                return False
+        elif key == '_not':
+            if matches(row, condition):
+                return False
+        else:
+            value = row.get(key)
+            for op, operand in condition.items():
+                if not _compare(op, value, operand):
+                    return False
+    return True
+
+
+def _sort(rows, order_by):
+    if isinstance(order_by, dict):
+        order_by = [order_by]
+    keys = [(column, direction) for clause in order_by for column, direction in clause.items()]
+    # Apply the least significant key first; Python's sort is stable
+    for column, direction in reversed(keys):
+        descending = str(direction).startswith('desc')
+        rows.sort(key=lambda row: (row.get(column) is None, _coerce(row.get(column))), reverse=descending)
+    return rows
+
+
+def _project(row, selections, entity):
+    projected = {}
+    for selection in selections:
+        name = selection.name.value
+        key = selection.alias.value if selection.alias else name
+        projected[key] = entity if name == '__typename' else row.get(name)
+    return projected
+
+
+class FixtureStore:
+    """Fixture-backed entity tables, loaded lazily from ``<dir>/<Entity>.json`` or ``.jsonl``"""
+
+    def __init__(self, fixtures_dir, schema_path=SCHEMA_PATH):
+        self.fixtures_dir = fixtures_dir
+        self.entities = load_entity_names(schema_path)
+        self._tables = {}
+
+    def table(self, entity):
+        if entity not in self._tables:
+            if entity not in self.entities:
+                raise QueryError(f"field '{entity}' not found in type: 'query_root'")
+            self._tables[entity] = self._load(entity)
+        return self._tables[entity]
+
+    def _load(self, entity):
+        json_path = os.path.join(self.fixtures_dir, f"{entity}.json")
+        jsonl_path = os.path.join(self.fixtures_dir, f"{entity}.jsonl")
+        if os.path.exists(json_path):
+            with open(json_path) as f:
+                return json.load(f)
+        if os.path.exists(jsonl_path):
+            with open(jsonl_path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        # Entities without fixtures behave like empty tables
+        return []
+
+    def select(self, entity, where=None, order_by=None, limit=None, offset=None):
+        """Return the rows of an entity after filtering, ordering and paging"""
+        rows = self.table(entity)
+        rows = [row for row in rows if matches(row, where)] if where else list(rows)
+        if order_by:
+            rows = _sort(rows, order_by)
+        if offset:
+            rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
+
+    def execute(self, query, variables=None, operation_name=None):
+        """Execute a query document and return the ``data`` payload"""
+        document = parse(query) if isinstance(query, str) else query
+        operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+        if operation_name:
+            operations = [op for op in operations if op.name and op.name.value == operation_name]
+        if len(operations) != 1:
+            raise QueryError("Expected exactly one operation in the document")
+        operation = operations[0]
+        if operation.operation.value != 'query':
+            raise QueryError(f"Unsupported operation type: {operation.operation.value}")
+
+        variables = variables or {}
+        data = {}
+        for field in operation.selection_set.selections:
+            if not isinstance(field, FieldNode):
+                raise QueryError("Fragments are not supported by the stand-in")
+            entity = field.name.value
+            args = {arg.name.value: value_from_ast_untyped(arg.value, variables) for arg in field.arguments or ()}
+            rows = self.select(
+                entity,
+                where=args.get('where'),
+                order_by=args.get('order_by'),
+                limit=args.get('limit'),
+                offset=args.get('offset'),
+            )
+            selections = field.selection_set.selections if field.selection_set else []
+            key = field.alias.value if field.alias else entity
+            data[key] = [_project(row, selections, entity) for row in rows]
+        return data
@@ -0,0 +1,160 @@
+"""Generate synthetic fixtures for every schema.graphql entity.
+
+    python -m standin.generate --out standin/fixtures --days 180 --wallets 500
+
+Amounts are BigInt strings scaled by 1e9 like the indexer's, and timestamps are
+unix seconds ending at the current time, so the dashboard's 2-week windows are
+populated.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+PRECISION = 10 ** 9
+ASSETS = ['ETH', 'FUEL']
+
+
+def _amount(rng, low, high):
+    return str(int(rng.uniform(low, high) * PRECISION))
+
+
+def _tx(rng):
+    return '0x' + '%064x' % rng.getrandbits(256)
+
+
+def generate(days=180, wallets=500, events_per_day=200, seed=0, end=None):
+    """Return {entity: rows} with a plausible mix of protocol activity"""
+    rng = random.Random(seed)
+    end = int(end or time.time())
+    start = end - days * 86400
+    identities = ['0x' + '%064x' % rng.getrandbits(256) for _ in range(wallets)]
+    tables = {name: [] for name in (
+        'BorrowOperations_OpenTroveEvent', 'BorrowOperations_CloseTroveEvent',
+        'BorrowOperations_AdjustTroveEvent', 'MoorStaking_StakeEvent', 'MoorStaking_UnstakeEvent',
+        'StabilityPool_StabilityPoolLiquidationEvent', 'StabilityPool_ProvideToStabilityPoolEvent',
+        'StabilityPool_WithdrawFromStabilityPoolEvent', 'TroveManager_TrovePartialLiquidationEvent',
+        'TroveManager_TroveFullLiquidationEvent', 'TroveManager_RedemptionEvent',
+        'USDM_TotalSupplyEvent', 'USDM_Mint', 'USDM_Burn',
+    )}
+
+    open_troves = {}  # (identity, asset) -> [collateral, debt]
+    sp_deposits = {}
+    staked = {}
+    supply = 0
+    counter = 0
+    timestamps = sorted(rng.randint(start, end) for _ in range(days * events_per_day))
+
+    def emit(entity, timestamp, **fields):
+        nonlocal counter
+        counter += 1
+        row = {'id': f"{entity}-{counter}", 'timestamp': timestamp, 'txHash': _tx(rng)}
+        row.update(fields)
+        tables[entity].append(row)
+
+    for timestamp in timestamps:
+        identity = rng.choice(identities)
+        asset = rng.choice(ASSETS)
+        key = (identity, asset)
+        roll = rng.random()
+
+        if key not in open_troves and roll < 0.5:
+            collateral, debt = rng.uniform(100, 50_000), rng.uniform(500, 20_000)
+            open_troves[key] = [collateral, debt]
+            supply += debt
+            emit('BorrowOperations_OpenTroveEvent', timestamp, identity=identity, asset=asset,
+                 collateral=str(int(collateral * PRECISION)), debt=str(int(debt * PRECISION)))
+            emit('USDM_Mint', timestamp, amount=str(int(debt * PRECISION)))
+        elif key in open_troves and roll < 0.35:
+            collateral, debt = open_troves[key]
+            change = rng.uniform(0, collateral * 0.3)
+            increase = rng.random() < 0.6
+            collateral = collateral + change if increase else collateral - change
+            open_troves[key] = [collateral, debt]
+            emit('BorrowOperations_AdjustTroveEvent', timestamp, identity=identity, asset=asset,
+                 collateral=str(int(collateral * PRECISION)), debt=str(int(debt * PRECISION)),
+                 collateralChange=str(int(change * PRECISION)), debtChange='0',
+                 isDebtIncrease=False, isCollateralIncrease=increase)
+        elif key in open_troves and roll < 0.45:
+            collateral, debt = open_troves.pop(key)
+            supply -= debt
+            emit('BorrowOperations_CloseTroveEvent', timestamp, identity=identity, asset=asset,
+                 collateral=str(int(collateral * PRECISION)), debt=str(int(debt * PRECISION)))
+            emit('USDM_Burn', timestamp, amount=str(int(debt * PRECISION)))
+        elif key in open_troves and roll < 0.48:
+            collateral, debt = open_troves.pop(key)
+            emit('TroveManager_TroveFullLiquidationEvent', timestamp, identity=identity, asset=asset,
+                 debt=str(int(debt * PRECISION)), collateral=str(int(collateral * PRECISION)))
+            emit('StabilityPool_StabilityPoolLiquidationEvent', timestamp, asset=asset,
+                 debt_to_offset=str(int(debt * PRECISION)), collateral_to_offset=str(int(collateral * PRECISION)))
+        elif key in open_troves and roll < 0.50:
+            collateral, debt = open_troves[key]
+            open_troves[key] = [collateral * 0.5, debt * 0.5]
+            emit('TroveManager_TrovePartialLiquidationEvent', timestamp, identity=identity, asset=asset,
+                 remaining_debt=str(int(debt * 0.5 * PRECISION)),
+                 remaining_collateral=str(int(collateral * 0.5 * PRECISION)))
+        elif key in open_troves and roll < 0.52:
+            collateral, debt = open_troves[key]
+            redeemed = debt * rng.uniform(0.05, 0.3)
+            price = rng.uniform(1, 4000 if asset == 'ETH' else 0.1)
+            collateral_amount = min(collateral, redeemed / price)
+            open_troves[key] = [collateral - collateral_amount, debt - redeemed]
+            supply -= redeemed
+            emit('TroveManager_RedemptionEvent', timestamp, identity=identity, asset=asset,
+                 usdm_amount=str(int(redeemed * PRECISION)),
+                 collateral_amount=str(int(collateral_amount * PRECISION)),
+                 collateral_price=str(int(price * PRECISION)))
+            emit('USDM_Burn', timestamp, amount=str(int(redeemed * PRECISION)))
+        elif roll < 0.70:
+            balance = sp_deposits.get(identity, 0.0)
+            if balance > 0 and rng.random() < 0.4:
+                amount = rng.uniform(0, balance)
+                sp_deposits[identity] = balance - amount
+                emit('StabilityPool_WithdrawFromStabilityPoolEvent', timestamp, identity=identity,
+                     amount=str(int(amount * PRECISION)), compounded_amount=str(int(balance * PRECISION)))
+            else:
+                amount = rng.uniform(10, 10_000)
+                sp_deposits[identity] = balance + amount
+                emit('StabilityPool_ProvideToStabilityPoolEvent', timestamp, identity=identity,
+                     amount=str(int(amount * PRECISION)), compounded_amount=str(int(balance * PRECISION)))
+        else:
+            balance = staked.get(identity, 0.0)
+            if balance > 0 and rng.random() < 0.3:
+                amount = rng.uniform(0, balance)
+                staked[identity] = balance - amount
+                emit('MoorStaking_UnstakeEvent', timestamp, identity=identity, amount=str(int(amount * PRECISION)))
+            else:
+                amount = rng.uniform(100, 100_000)
+                staked[identity] = balance + amount
+                emit('MoorStaking_StakeEvent', timestamp, identity=identity, amount=str(int(amount * PRECISION)))
+            continue
+
+        emit('USDM_TotalSupplyEvent', timestamp, amount=str(int(max(supply, 0) * PRECISION)))
+
+    return tables
+
+
+def write_fixtures(tables, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for entity, rows in tables.items():
+        with open(os.path.join(out_dir, f"{entity}.json"), 'w') as f:
+            json.dump(rows, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic GraphQL stand-in fixtures")
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'fixtures'))
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--wallets', type=int, default=500)
+    parser.add_argument('--events-per-day', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tables = generate(args.days, args.wallets, args.events_per_day, args.seed)
+    write_fixtures(tables, args.out)
+    print(f"Wrote {sum(len(rows) for rows in tables.values()):,} rows for {len(tables)} entities to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
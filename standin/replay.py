@@ -0,0 +1,155 @@
+"""Record GraphQL responses to JSONL and play them back with injected latency.
+
+Each JSONL line holds one exchange::
+
+    {"key": ..., "query": ..., "variables": ..., "data": ..., "errors": ..., "elapsed_ms": ...}
+
+``key`` is derived from the normalized query text and the variables, so
+whitespace differences between callers do not cause replay misses.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+
+from gql.transport.transport import Transport
+from graphql import ExecutionResult, parse, print_ast
+
+from standin.engine import QueryError
+
+
+def normalize_query(query):
+    """Return a canonical text form of a query string or document"""
+    document = parse(query) if isinstance(query, str) else query
+    return print_ast(document)
+
+
+def request_key(query, variables=None):
+    """Stable lookup key for a (query, variables) pair"""
+    payload = normalize_query(query) + '\n' + json.dumps(variables or {}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _unpack_request(request, kwargs):
+    # gql >= 4 passes a GraphQLRequest; gql 3 passes the document plus keyword arguments
+    document = getattr(request, 'document', request)
+    variables = getattr(request, 'variable_values', None) or kwargs.get('variable_values')
+    operation_name = getattr(request, 'operation_name', None) or kwargs.get('operation_name')
+    return document, variables, operation_name
+
+
+class Recorder:
+    """Append-only JSONL writer for GraphQL exchanges, safe to share between threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, query, variables, data, errors=None, elapsed_ms=0.0):
+        line = json.dumps({
+            'key': request_key(query, variables),
+            'query': normalize_query(query),
+            'variables': variables,
+            'data': data,
+            'errors': errors,
+            'elapsed_ms': round(elapsed_ms, 3),
+        })
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class Replayer:
+    """Serve recorded exchanges by key, sleeping to simulate upstream latency.
+
+    The injected delay is ``latency_ms + uniform(0, jitter_ms) + recorded_scale * elapsed_ms``,
+    so a recording can be replayed instantly, at a fixed latency or at (a multiple of)
+    the latency observed while recording.
+    """
+
+    def __init__(self, path, latency_ms=0.0, jitter_ms=0.0, recorded_scale=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.recorded_scale = recorded_scale
+        self._random = random.Random(seed)
+        self._exchanges = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    # Later recordings of the same request win
+                    self._exchanges[exchange['key']] = exchange
+
+    def __len__(self):
+        return len(self._exchanges)
+
+    def delay_ms(self, exchange):
+        jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return self.latency_ms + jitter + self.recorded_scale * exchange.get('elapsed_ms', 0.0)
+
+    def lookup(self, query, variables=None):
+        """Return the recorded exchange after the injected delay; KeyError if never recorded"""
+        key = request_key(query, variables)
+        if key not in self._exchanges:
+            raise KeyError(f"No recorded response for query {key[:12]}")
+        exchange = self._exchanges[key]
+        delay = self.delay_ms(exchange)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return exchange
+
+
+class RecordingTransport(Transport):
+    """Wrap a live transport and append every response it returns to a JSONL file"""
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.recorder = Recorder(path)
+
+    def connect(self):
+        self.transport.connect()
+
+    def close(self):
+        self.transport.close()
+
+    def execute(self, request, *args, **kwargs):
+        document, variables, _ = _unpack_request(request, kwargs)
+        started = time.perf_counter()
+        result = self.transport.execute(request, *args, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        errors = [getattr(e, 'formatted', e) for e in result.errors] if result.errors else None
+        self.recorder.record(document, variables, result.data, errors, elapsed_ms)
+        return result
+
+
+class ReplayTransport(Transport):
+    """Answer queries from a JSONL recording without touching the network"""
+
+    def __init__(self, path, latency_ms=0.0, jitter_ms=0.0, recorded_scale=0.0, seed=None):
+        self.replayer = Replayer(path, latency_ms, jitter_ms, recorded_scale, seed)
+
+    def execute(self, request, *args, **kwargs):
+        document, variables, _ = _unpack_request(request, kwargs)
+        exchange = self.replayer.lookup(document, variables)
+        return ExecutionResult(data=exchange['data'], errors=exchange.get('errors'))
+
+
+class FixtureTransport(Transport):
+    """Answer queries in-process from a FixtureStore, with optional injected latency"""
+
+    def __init__(self, store, latency_ms=0.0, jitter_ms=0.0, seed=None):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+    def execute(self, request, *args, **kwargs):
+        document, variables, operation_name = _unpack_request(request, kwargs)
+        delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        try:
+            return ExecutionResult(data=self.store.execute(document, variables, operation_name))
+        except QueryError as e:
+            return ExecutionResult(errors=[{'message': str(e)}])
@@ -0,0 +1,135 @@
+"""HTTP stand-in for the Hasura GraphQL endpoint.
+
+Point ``GRAPHQL_URL`` at this server to run the api, dashboard or rewards script
+without network access. Three modes:
+
+    # serve schema.graphql entities from fixture files
+    python -m standin.server --fixtures standin/fixtures
+
+    # proxy to a live Hasura and record every exchange
+    python -m standin.server --upstream http://localhost:8080/v1/graphql --record capture.jsonl
+
+    # replay a recording with 80ms +/- 40ms injected latency
+    python -m standin.server --replay capture.jsonl --latency-ms 80 --jitter-ms 40
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from standin.engine import FixtureStore, QueryError
+from standin.replay import Recorder, Replayer
+
+
+class FixtureBackend:
+    def __init__(self, fixtures_dir, latency_ms=0.0, jitter_ms=0.0):
+        self.store = FixtureStore(fixtures_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def handle(self, body):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        try:
+            return {'data': self.store.execute(body['query'], body.get('variables'), body.get('operationName'))}
+        except QueryError as e:
+            return {'errors': [{'message': str(e)}]}
+
+
+class ReplayBackend:
+    def __init__(self, path, latency_ms=0.0, jitter_ms=0.0, recorded_scale=0.0):
+        self.replayer = Replayer(path, latency_ms, jitter_ms, recorded_scale)
+
+    def handle(self, body):
+        try:
+            exchange = self.replayer.lookup(body['query'], body.get('variables'))
+        except KeyError as e:
+            return {'errors': [{'message': str(e)}]}
+        response = {'data': exchange['data']}
+        if exchange.get('errors'):
+            response['errors'] = exchange['errors']
+        return response
+
+
+class RecordingProxyBackend:
+    def __init__(self, upstream_url, path, timeout=60):
+        self.upstream_url = upstream_url
+        self.recorder = Recorder(path)
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def handle(self, body):
+        started = time.perf_counter()
+        response = self.session.post(self.upstream_url, json=body, timeout=self.timeout)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        payload = response.json()
+        self.recorder.record(body['query'], body.get('variables'), payload.get('data'),
+                             payload.get('errors'), elapsed_ms)
+        return payload
+
+
+def make_handler(backend):
+    class GraphQLHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length))
+                payload = backend.handle(body)
+                status = 200
+            except Exception as e:
+                payload = {'errors': [{'message': f"{type(e).__name__}: {e}"}]}
+                status = 500
+            encoded = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, format, *args):
+            # Keep request logging off the hot path during load tests
+            pass
+
+    return GraphQLHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Hasura GraphQL endpoint")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--fixtures', help="Directory of <Entity>.json / <Entity>.jsonl fixture files")
+    mode.add_argument('--replay', help="JSONL recording to play back")
+    mode.add_argument('--upstream', help="Live GraphQL URL to proxy to (requires --record)")
+    parser.add_argument('--record', help="JSONL file to append proxied exchanges to")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Fixed latency added to every response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Uniform random latency added on top")
+    parser.add_argument('--recorded-scale', type=float, default=0.0,
+                        help="Replay only: add this multiple of the latency observed while recording")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        backend = FixtureBackend(args.fixtures, args.latency_ms, args.jitter_ms)
+    elif args.replay:
+        backend = ReplayBackend(args.replay, args.latency_ms, args.jitter_ms, args.recorded_scale)
+    else:
+        if not args.record:
+            parser.error("--upstream requires --record")
+        backend = RecordingProxyBackend(args.upstream, args.record)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(backend))
+    print(f"GraphQL stand-in listening on http://{args.host}:{args.port}/v1/graphql")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()